@@ -1,19 +1,56 @@
 from __future__ import annotations
 
+import asyncio
 import textwrap
-from typing import TYPE_CHECKING, List
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple
 from pathlib import Path
 
 from panpath import CloudPath
 from pipen import plugin
+from pipen.utils import get_logger
+from xqute import JobStatus
 
 from .version import __version__
 from .session_info import get_inject_session_code_fun
+from .reader import (
+    ARCHIVE_FILENAME,
+    DEDUP_KINDS,
+    DEDUP_PAYLOAD_KEY,
+    END_TIME_KEY,
+    RUNINFO_KINDS,
+    STORE_DIRNAME,
+    parse_time,
+    read_runinfo,
+)
+from .sampling import SAMPLED_ENVVAR, TMPDIR_ENVVAR, check_sample, is_sampled
+from .live import LIVE_METRICS_END_BASH, LiveMetrics, live_metrics_code
+from .resources import RESOURCES_BASH
+from .archive import pack_runinfo
+from .trace import TRACE_FILENAME, TraceWriter
+from .stragglers import (
+    DEFAULT_THRESHOLD,
+    MIN_JOBS,
+    STRAGGLERS_FILENAME,
+    detect_stragglers,
+    format_report,
+    time_record,
+)
 
 if TYPE_CHECKING:  # pragma: no cover
     from pipen import Proc, Pipen
     from pipen.job import Job
 
+logger = get_logger("runinfo")
+# The keys in job.runinfo.time recording what is saved by the deduplication
+DEDUP_KEYS = (
+    "Dedup payloads stored",
+    "Dedup payloads reused",
+    "Dedup bytes saved",
+)
+# The max time (seconds) to wait for the jobs to finalize their runinfo
+RUNINFO_WAIT_TIMEOUT = 30
+
 
 def _get_lang(langpath: str | List[str]):
     if isinstance(langpath, list):
@@ -36,6 +73,275 @@ def _get_lang(langpath: str | List[str]):
     return stem
 
 
+def _get_plugin_opt(proc: Proc, name: str, default: Any = None) -> Any:
+    """Get the plugin option from the process, falling back to the pipeline"""
+    pipeline_plugin_opts = proc.pipeline.config.get("plugin_opts", None) or {}
+    proc_plugin_opts = proc.plugin_opts or {}
+    return proc_plugin_opts.get(name, pipeline_plugin_opts.get(name, default))
+
+
+def _dedup_code(job: Job) -> str:
+    """The bash code to store the session and device info once per process,
+    under their content hash, instead of in the job metadir
+
+    The payloads are referred to in `job.runinfo.time` (see `DEDUP_PAYLOAD_KEY`),
+    which is written (and uploaded) anyway, so no file is left in the metadir.
+    What is saved is recorded in `job.runinfo.time` as well (see `DEDUP_KEYS`).
+    """
+    store = f"{job.metadir.mounted.parent}/{STORE_DIRNAME}"
+    ref = DEDUP_PAYLOAD_KEY.format(kind="$runinfo_kind")
+    if isinstance(job.metadir.mounted, CloudPath):  # pragma: no cover
+        # List the store once, rather than checking every payload
+        check = 'grep -qxF "$runinfo_blob" <<< "$runinfo_blobs"'
+        store_blob = f'cloudsh cp "$runinfo_file" "{store}/$runinfo_blob"'
+        init = f'runinfo_blobs=$(cloudsh ls "{store}" 2>/dev/null | sed "s|.*/||")'
+        # The ones left by previous runs are not removed, to save the requests,
+        # they are shadowed by the references anyway
+        clean = ""
+    else:
+        check = f'[[ -f "{store}/$runinfo_blob" ]]'
+        # rename is atomic, concurrent jobs never see partial payloads
+        store_blob = (
+            f'mv -f "$runinfo_file" "{store}/.$runinfo_blob.$$"\n'
+            + " " * 20
+            + f'mv -f "{store}/.$runinfo_blob.$$" "{store}/$runinfo_blob"'
+        )
+        init = f'mkdir -p "{store}"'
+        clean = f'rm -f "{job.metadir.mounted}/job.runinfo.$runinfo_kind"'
+
+    return textwrap.dedent(
+        f"""
+        # plugin: runinfo (dedup)
+        runinfo_dedup_stored=0
+        runinfo_dedup_reused=0
+        runinfo_dedup_saved=0
+        if sha256sum --version &>/dev/null; then
+            {init}
+            for runinfo_kind in {" ".join(DEDUP_KINDS)}; do
+                if [[ $runinfo_kind == device ]]; then
+                    runinfo_file=$runinfo_device
+                else
+                    runinfo_file="$runinfo_tmpdir/job.runinfo.$runinfo_kind"
+                fi
+                if [[ ! -f "$runinfo_file" ]]; then
+                    continue
+                fi
+                runinfo_hash=$(sha256sum "$runinfo_file" | cut -d ' ' -f1)
+                runinfo_blob="$runinfo_kind.$runinfo_hash"
+                if {check}; then
+                    runinfo_dedup_reused=$((runinfo_dedup_reused + 1))
+                    runinfo_dedup_saved=$((
+                        runinfo_dedup_saved + $(wc -c < "$runinfo_file")
+                    ))
+                else
+                    {store_blob}
+                    runinfo_dedup_stored=$((runinfo_dedup_stored + 1))
+                fi
+                rm -f "$runinfo_file"
+                {clean}
+                echo "{ref}: {STORE_DIRNAME}/$runinfo_blob" >> $runinfo_time
+            done
+        fi
+        echo "{DEDUP_KEYS[0]}: $runinfo_dedup_stored" >> $runinfo_time
+        echo "{DEDUP_KEYS[1]}: $runinfo_dedup_reused" >> $runinfo_time
+        echo "{DEDUP_KEYS[2]}: $runinfo_dedup_saved" >> $runinfo_time
+        """
+    )
+
+
+def _keep_runinfo_code(job: Job) -> str:
+    """The bash code to move the runinfo written by the job script to the
+    local temporary directory (see `TMPDIR_ENVVAR`) to the metadir"""
+    if isinstance(job.metadir.mounted, CloudPath):  # pragma: no cover
+        mv = "cloudsh mv"
+    else:
+        mv = "mv -f"
+
+    return textwrap.dedent(
+        f"""\
+        for runinfo_file in "$runinfo_tmpdir"/job.runinfo.*; do
+            if [[ -f "$runinfo_file" ]]; then
+                {mv} "$runinfo_file" "{job.metadir.mounted}/${{runinfo_file##*/}}"
+            fi
+        done
+        """
+    )
+
+
+def _clean_runinfo_code(job: Job) -> str:
+    """The bash code to remove the runinfo (except the timing record) left by
+    the previous runs of the job"""
+    kinds = "|".join(kind for kind in RUNINFO_KINDS if kind != "time")
+    if isinstance(job.metadir.mounted, CloudPath):  # pragma: no cover
+        # List the metadir once, rather than removing every kind blindly
+        return textwrap.dedent(
+            f"""\
+            for runinfo_file in $(
+                cloudsh ls "{job.metadir.mounted}" 2>/dev/null \\
+                    | grep -oE 'job\\.runinfo\\.({kinds})$'
+            ); do
+                cloudsh rm -f "{job.metadir.mounted}/$runinfo_file"
+            done
+            """
+        )
+
+    return textwrap.dedent(
+        f"""\
+        for runinfo_file in "{job.metadir.mounted}"/job.runinfo.*; do
+            if [[ "$runinfo_file" =~ \\.({kinds})$ ]]; then
+                rm -f "$runinfo_file"
+            fi
+        done
+        """
+    )
+
+
+async def _wait_for_runinfo(proc: Proc) -> None:
+    """Wait for the jobs of the process to finalize their runinfo, which is
+    done after the jobs are marked as finished"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RUNINFO_WAIT_TIMEOUT
+    for job in proc.jobs:
+        # Cached jobs or jobs not run (e.g. the process failed)
+        if getattr(job, "_runinfo_cached", False) or (
+            await job.get_status()
+        ) not in (JobStatus.FINISHED, JobStatus.FAILED):
+            continue
+
+        time_file = job.metadir / "job.runinfo.time"
+        while loop.time() < deadline:
+            try:
+                if END_TIME_KEY in await time_file.a_read_text():
+                    break
+            except Exception:
+                # Not generated or uploaded yet
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            proc.log(
+                "warning",
+                "runinfo: timed out waiting for the runinfo of the jobs",
+                logger=logger,
+            )
+            return
+
+
+def _dedup_stats(proc: Proc) -> List[int]:
+    """Sum up what is saved by the deduplication for the jobs run this time
+
+    Returns:
+        The number of the jobs deduplicated (reusing any stored payload), the
+        number of the payloads stored, the number of the payloads reused
+        (storing and, for cloud workdirs, uploading saved) and the bytes saved
+    """
+    out = [0, 0, 0, 0]
+    for _, info in _time_records(proc):
+        try:
+            stored, reused, saved = (int(info[key]) for key in DEDUP_KEYS)
+        except (KeyError, ValueError):
+            continue
+        out[0] += reused > 0
+        out[1] += stored
+        out[2] += reused
+        out[3] += saved
+    return out
+
+
+async def _report_dedup(proc: Proc) -> None:
+    """Report what is saved by the deduplication for the jobs of the process"""
+    n_dedup, n_stored, n_reused, n_saved = await asyncio.to_thread(
+        _dedup_stats,
+        proc,
+    )
+    proc.log(
+        "info",
+        "runinfo: %s job(s) deduplicated, %s payload(s) stored, "
+        "%s payload(s) reused (%s bytes not stored or uploaded)",
+        n_dedup,
+        n_stored,
+        n_reused,
+        n_saved,
+        logger=logger,
+    )
+
+
+def _straggler_records(proc: Proc) -> Dict[int, Tuple[str, float]]:
+    """Collect the host and the elapsed time of the jobs of the process"""
+    records = {}
+    for job in proc.jobs:
+        content = read_runinfo(job.metadir, "time")
+        record = time_record(content) if content else None
+        if record is not None:
+            records[job.index] = record
+    return records
+
+
+async def _report_stragglers(proc: Proc, threshold: float) -> None:
+    """Detect the straggler jobs and the slow hosts of the process, write the
+    report to the process workdir and warn about them"""
+    records = await asyncio.to_thread(_straggler_records, proc)
+    if len(records) < MIN_JOBS:
+        proc.log(
+            "debug",
+            "runinfo: not enough jobs with elapsed time to detect stragglers",
+            logger=logger,
+        )
+        return
+
+    hosts, stragglers = detect_stragglers(records, threshold)
+    report = proc.workdir / STRAGGLERS_FILENAME
+    await report.a_write_text(format_report(hosts, stragglers, threshold))
+
+    slow_hosts = [stats for stats in hosts if stats.zscore > threshold]
+    if stragglers or slow_hosts:
+        proc.log(
+            "warning",
+            "runinfo: %s straggler job(s) %s, slow host(s) %s, see %s",
+            len(stragglers),
+            [straggler.index for straggler in stragglers][:10],
+            [
+                f"{stats.host} ({stats.relative_throughput:.0%} throughput)"
+                for stats in slow_hosts
+            ],
+            report,
+            logger=logger,
+        )
+
+
+def _time_records(proc: Proc) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield the index and the parsed time info of the jobs run this time"""
+    for job in proc.jobs:
+        if getattr(job, "_runinfo_cached", False):
+            continue
+        content = read_runinfo(job.metadir, "time")
+        if content:
+            yield job.index, parse_time(content)
+
+
+async def _pack_runinfo(proc: Proc) -> None:
+    """Pack the runinfo files of the jobs of the process into its archive"""
+    if isinstance(proc.workdir, CloudPath):  # pragma: no cover
+        proc.log(
+            "warning",
+            "runinfo: packing is not supported for cloud workdirs, skipped",
+            logger=logger,
+        )
+        return
+
+    n_files = await asyncio.to_thread(
+        pack_runinfo,
+        proc.workdir,
+        [job.index for job in proc.jobs],
+    )
+    proc.log(
+        "info",
+        "runinfo: %s file(s) packed into %s",
+        n_files,
+        proc.workdir / ARCHIVE_FILENAME,
+        logger=logger,
+    )
+
+
 class PipenRuninfoPlugin:
     name = "runinfo"
     version = __version__
@@ -50,9 +356,121 @@ class PipenRuninfoPlugin:
         # Whether to include submodules in the runinfo (for python only)
         # Either pipeline-level option or process-level option
         pipen.config.plugin_opts.setdefault("runinfo_submod", False)
+        # Whether to record the import/load time of the modules (for python and R)
+        # True for the top 50 modules by self time, or an integer for top N
+        # Either pipeline-level option or process-level option
+        pipen.config.plugin_opts.setdefault("runinfo_importtime", False)
         # Specify the lang directly instead of inferring from the proc.lang
         # Process-level option
         pipen.config.plugin_opts.setdefault("runinfo_lang", None)
+        # Whether to store identical session/device info once per process
+        # Either pipeline-level option or process-level option
+        pipen.config.plugin_opts.setdefault("runinfo_dedup", False)
+        # Which jobs to collect full runinfo (device and session) for,
+        # other jobs only get the timing record. Failed jobs are always collected.
+        # None for all jobs, or a dict with keys first, every, fraction and seed
+        # Either pipeline-level option or process-level option
+        pipen.config.plugin_opts.setdefault("runinfo_sample", None)
+        # The interval (seconds) for the jobs to flush live metrics
+        # (job.runinfo.live) while running, 0 to disable
+        # Either pipeline-level option or process-level option
+        pipen.config.plugin_opts.setdefault("runinfo_live", 0)
+        # The localhost port to serve the live metrics of all running jobs
+        # in OpenMetrics text format, None to disable
+        # Pipeline-level option
+        pipen.config.plugin_opts.setdefault("runinfo_live_port", None)
+        # The file to write the live metrics of all running jobs
+        # in OpenMetrics text format, None to disable
+        # Pipeline-level option
+        pipen.config.plugin_opts.setdefault("runinfo_live_textfile", None)
+        # Whether to detect the straggler jobs and the slow hosts when a process
+        # is done, by the robust z-score of the elapsed time of the jobs
+        # True for the threshold of 3.5, or a number for the threshold
+        # Either pipeline-level option or process-level option
+        pipen.config.plugin_opts.setdefault("runinfo_stragglers", False)
+        # Whether to pack the runinfo files of the jobs into an archive
+        # (proc.runinfo.zip) under the process workdir when the process is done,
+        # removing the loose files
+        # Either pipeline-level option or process-level option
+        pipen.config.plugin_opts.setdefault("runinfo_pack", False)
+        # Whether to write the jobs of the pipeline to a trace-event JSON file
+        # (for chrome://tracing or Perfetto), True for
+        # <pipeline workdir>/pipeline.runinfo.trace.json, or a path
+        # Pipeline-level option
+        pipen.config.plugin_opts.setdefault("runinfo_trace", False)
+
+    @plugin.impl
+    async def on_start(pipen: Pipen):
+        """Called when the pipeline starts.
+
+        Start the trace file and the aggregator of the live metrics if requested.
+        """
+        # Follow the level of the pipeline to show the reports
+        logger.setLevel(pipen.config.loglevel.upper())
+        plugin_opts = pipen.config.plugin_opts
+        trace = plugin_opts.get("runinfo_trace", False)
+        if trace is True and isinstance(pipen.workdir, CloudPath):  # pragma: no cover
+            logger.warning(
+                "runinfo: `runinfo_trace` should be a local path "
+                "for cloud workdirs, skipped"
+            )
+        elif trace:
+            pipen._runinfo_trace = TraceWriter(
+                pipen.workdir / TRACE_FILENAME if trace is True else trace
+            )
+            pipen._runinfo_trace.open()
+
+        port = plugin_opts.get("runinfo_live_port", None)
+        textfile = plugin_opts.get("runinfo_live_textfile", None)
+        if port is None and not textfile:
+            return
+
+        if not plugin_opts.get("runinfo_live", 0):
+            logger.warning(
+                "runinfo: `runinfo_live_port` or `runinfo_live_textfile` is set "
+                "but `runinfo_live` is 0, only the processes with `runinfo_live` "
+                "set will have live metrics"
+            )
+
+        live = LiveMetrics(
+            pipen.name,
+            interval=plugin_opts.get("runinfo_live", 0) or 10,
+            port=port,
+            textfile=textfile,
+            logger=logger,
+        )
+        try:
+            await live.start()
+        except OSError as exc:
+            # e.g. the port is in use, don't abort the pipeline for it
+            logger.warning(
+                "runinfo: failed to serve the live metrics on port %s (%s), skipped",
+                port,
+                exc,
+            )
+            if live.textfile is None:
+                return
+            live.port = None
+            await live.start()
+
+        pipen._runinfo_live = live
+
+    @plugin.impl
+    async def on_complete(pipen: Pipen, succeeded: bool):
+        """Called when the pipeline is completed.
+
+        Finish the trace file and stop the aggregator of the live metrics.
+        """
+        trace = getattr(pipen, "_runinfo_trace", None)
+        if trace is not None:
+            trace.close()
+            logger.info("runinfo: trace written to %s", trace.path)
+            pipen._runinfo_trace = None
+
+        live = getattr(pipen, "_runinfo_live", None)
+        if live is not None:
+            await live.stop()
+            pipen._runinfo_live = None
 
     @plugin.impl
     async def on_proc_script_computed(proc: Proc):
@@ -60,20 +478,11 @@ class PipenRuninfoPlugin:
 
         Try to modify the script so that we can get the runinfo.
         """
-        pipeline_plugin_opts = proc.pipeline.config.get("plugin_opts", None) or {}
-        proc_plugin_opts = proc.plugin_opts or {}
-        runinfo_path = proc_plugin_opts.get(
-            "runinfo_path",
-            pipeline_plugin_opts.get("runinfo_path", True),
-        )
-        runinfo_submod = proc_plugin_opts.get(
-            "runinfo_submod",
-            pipeline_plugin_opts.get("runinfo_submod", False),
-        )
-        runinfo_lang = proc_plugin_opts.get(
-            "runinfo_lang",
-            pipeline_plugin_opts.get("runinfo_lang", None),
-        )
+        runinfo_path = _get_plugin_opt(proc, "runinfo_path", True)
+        runinfo_submod = _get_plugin_opt(proc, "runinfo_submod", False)
+        runinfo_lang = _get_plugin_opt(proc, "runinfo_lang", None)
+        runinfo_importtime = _get_plugin_opt(proc, "runinfo_importtime", False)
+        check_sample(_get_plugin_opt(proc, "runinfo_sample", None))
         if not runinfo_lang:
             langpath = proc.lang
             runinfo_lang = _get_lang(langpath)
@@ -89,10 +498,74 @@ class PipenRuninfoPlugin:
             proc.script,
             show_path=runinfo_path,
             include_submodule=runinfo_submod,
+            importtime=runinfo_importtime,
         )
 
+    @plugin.impl
+    async def on_proc_done(proc: Proc, succeeded: bool | str):
+        """Called when a process is done.
+
+        Report how many payloads are stored for the jobs if deduplicated,
+        detect the straggler jobs and the slow hosts, add the jobs to the trace
+        and pack the runinfo files of the jobs if requested.
+        """
+        dedup = _get_plugin_opt(proc, "runinfo_dedup", False)
+        stragglers = _get_plugin_opt(proc, "runinfo_stragglers", False)
+        pack = _get_plugin_opt(proc, "runinfo_pack", False)
+        trace = getattr(proc.pipeline, "_runinfo_trace", None)
+        if not dedup and not stragglers and not pack and trace is None:
+            return
+
+        await _wait_for_runinfo(proc)
+        if dedup:
+            await _report_dedup(proc)
+        if stragglers:
+            await _report_stragglers(
+                proc,
+                DEFAULT_THRESHOLD if stragglers is True else float(stragglers),
+            )
+        if trace is not None:
+            await asyncio.to_thread(trace.add_proc, proc.name, _time_records(proc))
+        if pack:
+            await _pack_runinfo(proc)
+
+    @plugin.impl
+    async def on_job_cached(job: Job):
+        # Not to wait for the runinfo of the cached jobs
+        job._runinfo_cached = True
+
+    @plugin.impl
+    async def on_job_started(job: Job):
+        live = getattr(job.proc.pipeline, "_runinfo_live", None)
+        if live is not None:
+            live.add_job(job)
+
+    @plugin.impl
+    async def on_job_succeeded(job: Job):
+        live = getattr(job.proc.pipeline, "_runinfo_live", None)
+        if live is not None:
+            live.remove_job(job)
+
+    @plugin.impl
+    async def on_job_failed(job: Job):
+        live = getattr(job.proc.pipeline, "_runinfo_live", None)
+        if live is not None:
+            live.remove_job(job)
+
+    @plugin.impl
+    async def on_job_killed(job: Job):
+        live = getattr(job.proc.pipeline, "_runinfo_live", None)
+        if live is not None:  # pragma: no cover
+            live.remove_job(job)
+
     @plugin.impl
     def on_jobcmd_init(job: Job) -> str:
+        # Whether to collect full runinfo (device and session) for the job
+        sampled = int(
+            is_sampled(_get_plugin_opt(job.proc, "runinfo_sample", None), job.index)
+        )
+        # The wrapper is generated right before the job is submitted
+        submit = time.time()
         if isinstance(job.metadir.mounted, CloudPath):  # pragma: no cover
             return textwrap.dedent(
                 f"""
@@ -101,6 +574,11 @@ class PipenRuninfoPlugin:
                 runinfo_device=$(mktemp)
                 runinfo_time_orig="{job.metadir.mounted}/job.runinfo.time"
                 runinfo_time=$(mktemp)
+                runinfo_submit={submit:.6f}
+                runinfo_sampled={sampled}
+                export {SAMPLED_ENVVAR}={sampled}
+                runinfo_tmpdir=$(mktemp -d)
+                export {TMPDIR_ENVVAR}=$runinfo_tmpdir
                 """
             )
 
@@ -110,14 +588,20 @@ class PipenRuninfoPlugin:
                 # plugin: runinfo
                 runinfo_device="{job.metadir.mounted}/job.runinfo.device"
                 runinfo_time="{job.metadir.mounted}/job.runinfo.time"
+                runinfo_submit={submit:.6f}
+                runinfo_sampled={sampled}
+                export {SAMPLED_ENVVAR}={sampled}
+                runinfo_tmpdir=$(mktemp -d)
+                export {TMPDIR_ENVVAR}=$runinfo_tmpdir
                 """
             )
 
     @plugin.impl
     def on_jobcmd_prep(job: Job) -> str:
-        return textwrap.dedent(
+        code = textwrap.dedent(
             r"""
             # plugin: runinfo
+            runinfo_start=$(date +%%s.%%N)
             if env time -V &>/dev/null; then
                 cmd="env time \
                     -f '# Generated by pipen-runinfo v%(version)s\n\n\
@@ -139,60 +623,136 @@ Exit status: %%x' \
             fi
             """ % {"version": __version__}
         )
+        live_interval = _get_plugin_opt(job.proc, "runinfo_live", 0)
+        if live_interval:
+            code += live_metrics_code(job, live_interval)
+
+        return code
 
     @plugin.impl
     def on_jobcmd_end(job: Job) -> str:
-        return textwrap.dedent(
+        # The runinfo is finalized after the job is marked as finished, when
+        # the output of the wrapper may not be read anymore (e.g. the pipeline
+        # is done), so don't let the xtrace kill the wrapper with SIGPIPE
+        code = "\n# plugin: runinfo\ntrap '' PIPE\n"
+        if _get_plugin_opt(job.proc, "runinfo_live", 0):
+            code += LIVE_METRICS_END_BASH
+
+        code += textwrap.dedent(
             """        # plugin: runinfo
 
-            echo "# Generated by pipen-runinfo v%(version)s" > $runinfo_device
-            # shellcheck disable=SC2129
-            echo "" >> $runinfo_device
-            echo "Scheduler" >> $runinfo_device
-            echo "---------" >> $runinfo_device
-            echo "%(scheduler)s" >> $runinfo_device
-            echo "" >> $runinfo_device
-            echo "Hostname" >> $runinfo_device
-            echo "--------" >> $runinfo_device
-            hostname >> $runinfo_device
-            echo "" >> $runinfo_device
-            echo "CPU" >> $runinfo_device
-            echo "----" >> $runinfo_device
-            lscpu >> $runinfo_device
-            echo "" >> $runinfo_device
-            echo "Memory" >> $runinfo_device
-            echo "------" >> $runinfo_device
-            free -h >> $runinfo_device
-            echo "" >> $runinfo_device
-            echo "Disk" >> $runinfo_device
-            echo "----" >> $runinfo_device
-            df -h >> $runinfo_device
-            echo "" >> $runinfo_device
-            echo "Network" >> $runinfo_device
-            echo "-------" >> $runinfo_device
-            if ifconfig --version &>/dev/null; then
-                ifconfig >> $runinfo_device
-            else
-                if ip -V &>/dev/null; then
-                    ip a >> $runinfo_device
+            # Full runinfo for sampled or failed jobs only
+            if [[ $runinfo_sampled -eq 1 || $rc -ne 0 ]]; then
+                echo "# Generated by pipen-runinfo v%(version)s" > $runinfo_device
+                # shellcheck disable=SC2129
+                echo "" >> $runinfo_device
+                echo "Scheduler" >> $runinfo_device
+                echo "---------" >> $runinfo_device
+                echo "%(scheduler)s" >> $runinfo_device
+                echo "" >> $runinfo_device
+                echo "Hostname" >> $runinfo_device
+                echo "--------" >> $runinfo_device
+                hostname >> $runinfo_device
+                echo "" >> $runinfo_device
+                echo "CPU" >> $runinfo_device
+                echo "----" >> $runinfo_device
+                # The current frequency goes to the time info (see RESOURCES_BASH)
+                lscpu | grep -vE '^CPU( |[(]s[)] scaling )MHz:' >> $runinfo_device
+                echo "" >> $runinfo_device
+                echo "Memory" >> $runinfo_device
+                echo "------" >> $runinfo_device
+                free -h | awk 'NR > 1 {print $1, $2}' >> $runinfo_device
+                echo "" >> $runinfo_device
+                echo "Disk" >> $runinfo_device
+                echo "----" >> $runinfo_device
+                df -hP | awk '{print $1, $2, $6}' >> $runinfo_device
+                echo "" >> $runinfo_device
+                echo "Network" >> $runinfo_device
+                echo "-------" >> $runinfo_device
+                if ifconfig --version &>/dev/null; then
+                    ifconfig | grep -vE '^[[:space:]]*(RX|TX) ' >> $runinfo_device
                 else
-                    echo "Neither ifconfig nor ip is available." >> $runinfo_device
+                    if ip -V &>/dev/null; then
+                        ip a | grep -v valid_lft >> $runinfo_device
+                    else
+                        echo "Neither ifconfig nor ip is available." >> $runinfo_device
+                    fi
                 fi
-            fi
-            # shellcheck disable=SC2129
-            echo "" >> $runinfo_device
-            echo "GPU" >> $runinfo_device
-            echo "---" >> $runinfo_device
-            if nvidia-smi --version &>/dev/null; then
-                nvidia-smi >> $runinfo_device
+                # shellcheck disable=SC2129
+                echo "" >> $runinfo_device
+                echo "GPU" >> $runinfo_device
+                echo "---" >> $runinfo_device
+                if nvidia-smi --version &>/dev/null; then
+                    nvidia-smi --format=csv \\
+                        --query-gpu=index,name,driver_version,memory.total \\
+                        >> $runinfo_device
+                else
+                    echo "nvidia-smi is not available." >> $runinfo_device
+                fi
+                echo "" >> $runinfo_device
+
+                # The usage of the host differs from job to job, so it goes to
+                # the time info, keeping the device info the same for the jobs
+                # on the same host (see runinfo_dedup)
+                {
+                    awk '/^MemAvailable:/ {
+                        print "Memory available (kB): " $2
+                    }' /proc/meminfo
+                    awk '/^SwapFree:/ {print "Swap free (kB): " $2}' /proc/meminfo
+                    df -Pk . | awk 'NR == 2 {
+                        print "Disk available in working directory (kB): " $4
+                    }'
+                    if nvidia-smi --version &>/dev/null; then
+                        runinfo_gpu_mem=$(
+                            nvidia-smi --query-gpu=memory.used \\
+                                --format=csv,noheader,nounits
+                        )
+                        runinfo_gpu_mem=$(echo $runinfo_gpu_mem | tr ' ' ,)
+                        echo "GPU memory used (MiB): $runinfo_gpu_mem"
+                    fi
+                } >> $runinfo_time 2>/dev/null
             else
-                echo "nvidia-smi is not available." >> $runinfo_device
+                # Only the timing record for unsampled jobs that succeeded,
+                # also remove the ones left by previous runs
+                rm -f $runinfo_device
+%(clean)s
+            fi
+            """ % {
+                "scheduler": job.proc.scheduler.name,
+                "version": __version__,
+                "clean": textwrap.indent(_clean_runinfo_code(job), " " * 16).rstrip(),
+            }
+        )
+        code += RESOURCES_BASH
+        keep = _keep_runinfo_code(job)
+        if _get_plugin_opt(job.proc, "runinfo_dedup", False):
+            keep = _dedup_code(job) + keep
+
+        code += textwrap.dedent(
+            """
+            # plugin: runinfo (keeping the full runinfo of sampled or failed jobs)
+            if [[ $runinfo_sampled -eq 1 || $rc -ne 0 ]]; then
+            %s
             fi
-            echo "" >> $runinfo_device
+            rm -rf "$runinfo_tmpdir"
+            """
+        ) % textwrap.indent(keep.strip("\n"), " " * 4)
 
+        return code + textwrap.dedent(
+            """
+            # plugin: runinfo (job record, finalizing the runinfo)
+            {
+                echo "Hostname: $(hostname)"
+                echo "Return code: $rc"
+                echo "Submit time (epoch s): $runinfo_submit"
+                echo "Start time (epoch s): $runinfo_start"
+                echo "%s: $(date +%%s.%%N)"
+            } >> $runinfo_time
             if [[ -v runinfo_device_orig ]]; then
-                cloudsh mv $runinfo_device $runinfo_device_orig
+                if [[ -f $runinfo_device ]]; then
+                    cloudsh mv $runinfo_device $runinfo_device_orig
+                fi
                 cloudsh mv $runinfo_time $runinfo_time_orig
             fi
-            """ % {"scheduler": job.proc.scheduler.name, "version": __version__}
+            """ % END_TIME_KEY
         )
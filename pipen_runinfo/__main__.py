@@ -0,0 +1,52 @@
+"""Print the runinfo of a job.
+
+Usage: python -m pipen_runinfo <job metadir> [device|time|session|importtime|stats ...]
+"""
+from __future__ import annotations
+
+import sys
+from argparse import ArgumentParser
+
+from .reader import RUNINFO_KINDS, read_runinfo
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = ArgumentParser(
+        prog="python -m pipen_runinfo",
+        description=(
+            "Print the runinfo of a job, with deduplicated payloads and archives "
+            "resolved."
+        ),
+    )
+    parser.add_argument("metadir", help="The metadir of the job")
+    parser.add_argument(
+        "kinds",
+        nargs="*",
+        metavar="kind",
+        help=f"The kinds of runinfo to print, any of {RUNINFO_KINDS} "
+        "(default: all available)",
+    )
+    args = parser.parse_args(argv)
+    # choices does not play well with nargs="*" in older python versions
+    for kind in args.kinds:
+        if kind not in RUNINFO_KINDS:
+            parser.error(f"invalid kind: {kind!r} (choose from {RUNINFO_KINDS})")
+
+    rc = 0
+    for kind in args.kinds or RUNINFO_KINDS:
+        content = read_runinfo(args.metadir, kind)
+        if content is None and not args.kinds:
+            # Not all kinds are generated for every job
+            continue
+        if content is None:
+            print(f"job.runinfo.{kind} not found in {args.metadir}", file=sys.stderr)
+            rc = 1
+            continue
+
+        print(content, end="" if content.endswith("\n") else "\n")
+
+    return rc
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from .reader import ARCHIVE_FILENAME, RUNINFO_KINDS, STORE_DIRNAME, archive_member
+
+
+def pack_runinfo(procdir: str | Path, indexes: Iterable[int]) -> int:
+    """Pack the runinfo files of the jobs, and the deduplicated payloads, into
+    the archive of the process, and remove the loose files.
+
+    The archive is a zip file, whose central directory allows random access
+    to the runinfo of a job by its index. The runinfo of the jobs not run this
+    time (e.g. cached) is kept if the archive exists.
+
+    Args:
+        procdir: The workdir of the process
+        indexes: The indexes of the jobs
+
+    Returns:
+        The number of the files packed
+    """
+    procdir = Path(procdir)
+    archive = procdir / ARCHIVE_FILENAME
+    store = procdir / STORE_DIRNAME
+
+    loose: List[Tuple[str, Path]] = []
+    rerun = set()
+    for index in indexes:
+        for kind in RUNINFO_KINDS:
+            path = procdir / str(index) / f"job.runinfo.{kind}"
+            if path.is_file():
+                loose.append((archive_member(index, kind), path))
+                # Always generated once the job runs
+                if kind == "time":
+                    rerun.add(str(index))
+
+    if store.is_dir():
+        for path in sorted(store.iterdir()):
+            loose.append((f"{STORE_DIRNAME}/{path.name}", path))
+
+    if not loose:
+        return 0
+
+    members = {member for member, _ in loose}
+    tmpfile = procdir / f".{ARCHIVE_FILENAME}.tmp"
+    with zipfile.ZipFile(tmpfile, "w", zipfile.ZIP_DEFLATED) as zout:
+        if archive.is_file():
+            with zipfile.ZipFile(archive) as zin:
+                for info in zin.infolist():
+                    # Drop all the runinfo of the rerun jobs, as not every kind
+                    # is generated every time (e.g. runinfo_sample)
+                    if (
+                        info.filename in members
+                        or info.filename.split("/", 1)[0] in rerun
+                    ):
+                        continue
+                    zout.writestr(info, zin.read(info))
+
+        for member, path in loose:
+            zout.write(path, member)
+
+    # rename is atomic, readers never see a partial archive
+    tmpfile.replace(archive)
+    for _, path in loose:
+        path.unlink()
+    if store.is_dir() and not any(store.iterdir()):
+        store.rmdir()
+
+    return len(loose)
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import textwrap
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Mapping, Tuple
+
+from panpath import CloudPath
+
+from .version import __version__
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pipen.job import Job
+
+# The bash code to periodically flush the live metrics of a job.
+# The metrics are collected from the process tree of the job wrapper
+# (excluding the sampler itself).
+LIVE_METRICS_BASH = r"""
+# plugin: runinfo (live metrics)
+_runinfo_live() {
+    trap 'kill $runinfo_live_sleep 2>/dev/null; exit 0' TERM
+    local start prev_t prev_cpu max_running now stats cpu_pct
+    start=$(date +%%s)
+    prev_t=$start
+    prev_cpu=0
+    max_running=0
+    while true; do
+        now=$(date +%%s)
+        # rss (kB), cpu time (s), number of processes, threads and running threads
+        stats=$({
+            ps -e -o pid=,ppid=,rss=,time=,nlwp=
+            echo "--"
+            ps -e -L -o pid=,stat=
+        } | awk -v root=$$ -v me=$BASHPID '
+            $1 == "--" { threads = 1; next }
+            threads {
+                if ($2 ~ /^R/) running[$1]++
+                next
+            }
+            {
+                ppid[$1] = $2; rss[$1] = $3; t = $4; d = 0
+                if (index(t, "-")) { split(t, a, "-"); d = a[1]; t = a[2] }
+                n = split(t, b, ":"); s = 0
+                for (i = 1; i <= n; i++) s = s * 60 + b[i]
+                cpu[$1] = d * 86400 + s
+                nlwp[$1] = $5
+            }
+            END {
+                r = 0; c = 0; k = 0; w = 0; x = 0
+                for (p in ppid) {
+                    q = p
+                    while ((q in ppid) && q != root && q != me && q > 1) q = ppid[q]
+                    if (q == root && p != root) {
+                        r += rss[p]; c += cpu[p]; k++; w += nlwp[p]; x += running[p]
+                    }
+                }
+                printf "%%d %%d %%d %%d %%d", r, c, k, w, x
+            }')
+        set -- $stats
+        cpu_pct=0
+        if [[ $now -gt $prev_t && $2 -gt $prev_cpu ]]; then
+            cpu_pct=$(( ($2 - prev_cpu) * 100 / (now - prev_t) ))
+        fi
+        prev_t=$now
+        prev_cpu=$2
+        if [[ $5 -gt $max_running ]]; then
+            max_running=$5
+        fi
+        {
+            echo "# Generated by pipen-runinfo v%(version)s"
+            echo "timestamp: $now"
+            echo "elapsed_seconds: $((now - start))"
+            echo "rss_bytes: $(($1 * 1024))"
+            echo "cpu_percent: $cpu_pct"
+            echo "processes: $3"
+            echo "threads: $4"
+            echo "running_threads: $5"
+            echo "max_running_threads: $max_running"
+        } > "$runinfo_live.tmp"
+        mv -f "$runinfo_live.tmp" "$runinfo_live"
+        if [[ -v runinfo_live_orig ]]; then
+            cloudsh cp "$runinfo_live" "$runinfo_live_orig"
+        fi
+        sleep %(interval)s &
+        runinfo_live_sleep=$!
+        wait $runinfo_live_sleep
+    done
+}
+_runinfo_live </dev/null &>/dev/null &
+runinfo_live_pid=$!
+"""
+
+# The bash code to stop flushing the live metrics when the job is done
+LIVE_METRICS_END_BASH = r"""
+# plugin: runinfo (live metrics)
+if [[ -v runinfo_live_pid ]]; then
+    kill $runinfo_live_pid 2>/dev/null
+    wait $runinfo_live_pid 2>/dev/null
+    # The peak number of running threads, to check oversubscription
+    runinfo_max_running_threads=$(
+        awk -F': ' '/^max_running_threads:/ {print $2}' "$runinfo_live" 2>/dev/null
+    )
+    rm -f "$runinfo_live" "$runinfo_live.tmp"
+    if [[ -v runinfo_live_orig ]]; then
+        cloudsh rm -f "$runinfo_live_orig"
+    fi
+fi
+"""
+
+# name => (metric name, help)
+METRICS = {
+    "rss_bytes": ("pipen_job_rss_bytes", "Current resident set size of the job"),
+    "cpu_percent": (
+        "pipen_job_cpu_percent",
+        "CPU percentage the job got since the last flush",
+    ),
+    "elapsed_seconds": ("pipen_job_elapsed_seconds", "Elapsed time of the job"),
+    "processes": ("pipen_job_processes", "Number of processes of the job"),
+    "threads": ("pipen_job_threads", "Number of threads of the job"),
+    "running_threads": (
+        "pipen_job_running_threads",
+        "Number of running (runnable) threads of the job",
+    ),
+}
+
+
+def parse_live(content: str) -> Dict[str, float]:
+    """Parse the content of a `job.runinfo.live` file.
+
+    Args:
+        content: The content of the file
+
+    Returns:
+        The metrics, with names as keys
+    """
+    out = {}
+    for line in content.splitlines():
+        if line.startswith("#") or ": " not in line:
+            continue
+        key, value = line.split(": ", 1)
+        try:
+            out[key] = float(value)
+        except ValueError:
+            continue
+    return out
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def format_openmetrics(
+    pipeline: str,
+    metrics: Mapping[Tuple[str, int], Mapping[str, float]],
+) -> str:
+    """Format the live metrics of the running jobs in OpenMetrics text format.
+
+    Args:
+        pipeline: The name of the pipeline
+        metrics: The metrics of the jobs, with (proc name, job index) as keys
+
+    Returns:
+        The metrics in OpenMetrics text format
+    """
+    lines = [
+        "# TYPE pipen_running_jobs gauge",
+        "# HELP pipen_running_jobs Number of running jobs with live metrics",
+        f'pipen_running_jobs{{pipeline="{_escape(pipeline)}"}} {len(metrics)}',
+    ]
+    for key, (name, help_) in METRICS.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"# HELP {name} {help_}")
+        for (proc, index), job_metrics in sorted(metrics.items()):
+            if key not in job_metrics:
+                continue
+            labels = (
+                f'pipeline="{_escape(pipeline)}",proc="{_escape(proc)}",job="{index}"'
+            )
+            lines.append(f"{name}{{{labels}}} {job_metrics[key]:.15g}")
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class LiveMetrics:
+    """Aggregate the live metrics of the running jobs of a pipeline, and
+    expose them via a localhost HTTP port and/or a textfile.
+
+    Args:
+        pipeline: The name of the pipeline
+        interval: The interval (seconds) to refresh the metrics
+        port: The localhost port to serve the metrics, None to disable
+        textfile: The file to write the metrics, None to disable
+        logger: The logger to report the failures of refreshing the metrics
+    """
+
+    def __init__(
+        self,
+        pipeline: str,
+        interval: float,
+        port: int | None = None,
+        textfile: str | Path | None = None,
+        logger: logging.Logger | None = None,
+    ) -> None:
+        self.pipeline = pipeline
+        self.interval = interval
+        self.port = port
+        self.textfile = Path(textfile) if textfile else None
+        self.logger = logger or logging.getLogger(__name__)
+        self.jobs: Dict[Tuple[str, int], Job] = {}
+        self.text = format_openmetrics(pipeline, {})
+        self._task: asyncio.Task | None = None
+        self._server: asyncio.AbstractServer | None = None
+
+    def add_job(self, job: Job) -> None:
+        self.jobs[(job.proc.name, job.index)] = job
+
+    def remove_job(self, job: Job) -> None:
+        self.jobs.pop((job.proc.name, job.index), None)
+
+    async def collect(self) -> str:
+        """Read the live metrics files of the running jobs and format them"""
+        metrics = {}
+        for key, job in list(self.jobs.items()):
+            try:
+                content = await (job.metadir / "job.runinfo.live").a_read_text()
+            except Exception:
+                # Not flushed yet, or already removed
+                continue
+            metrics[key] = parse_live(content)
+
+        return format_openmetrics(self.pipeline, metrics)
+
+    def _write_textfile(self) -> None:
+        if self.textfile is None:
+            return
+        # Write and rename, so that the scrapers never see a partial file
+        tmpfile = self.textfile.with_name(f".{self.textfile.name}.{os.getpid()}")
+        tmpfile.write_text(self.text)
+        tmpfile.replace(self.textfile)
+
+    async def _refresh(self) -> None:
+        while True:
+            # Don't let a failed refresh stop the following ones
+            try:
+                self.text = await self.collect()
+                self._write_textfile()
+            except Exception as exc:
+                self.logger.warning(
+                    "runinfo: failed to refresh the live metrics (%s)",
+                    exc,
+                )
+            await asyncio.sleep(self.interval)
+
+    async def _serve(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            # We serve the metrics for whatever requested
+            while (await reader.readline()).strip():
+                pass
+            body = self.text.encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/openmetrics-text; version=1.0.0; "
+                b"charset=utf-8\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        """Start refreshing the metrics and serving them"""
+        if self.textfile is not None and not self.textfile.parent.is_dir():
+            self.logger.warning(
+                "runinfo: the directory of the live metrics textfile does not "
+                "exist (%s), skipped",
+                self.textfile.parent,
+            )
+            self.textfile = None
+        if self.port is not None:
+            self._server = await asyncio.start_server(
+                self._serve,
+                "127.0.0.1",
+                self.port,
+            )
+        self._task = asyncio.create_task(self._refresh())
+
+    async def stop(self) -> None:
+        """Stop refreshing and serving the metrics"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            except Exception as exc:  # pragma: no cover
+                self.logger.warning(
+                    "runinfo: failed to refresh the live metrics (%s)",
+                    exc,
+                )
+            self._task = None
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        self.jobs.clear()
+        self.text = format_openmetrics(self.pipeline, {})
+        try:
+            self._write_textfile()
+        except Exception as exc:
+            self.logger.warning(
+                "runinfo: failed to write the live metrics to %s (%s)",
+                self.textfile,
+                exc,
+            )
+
+
+def live_metrics_code(job: Job, interval: float) -> str:
+    """The bash code to start flushing the live metrics of the job
+
+    Args:
+        job: The job
+        interval: The interval (seconds) to flush the metrics
+
+    Returns:
+        The bash code
+    """
+    if isinstance(job.metadir.mounted, CloudPath):  # pragma: no cover
+        code = textwrap.dedent(
+            f"""
+            runinfo_live_orig="{job.metadir.mounted}/job.runinfo.live"
+            runinfo_live=$(mktemp)
+            """
+        )
+    else:
+        code = f'\nruninfo_live="{job.metadir.mounted}/job.runinfo.live"\n'
+
+    return code + LIVE_METRICS_BASH % {"version": __version__, "interval": interval}
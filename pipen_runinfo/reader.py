@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import threading
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+from panpath import PanPath
+
+# The kinds of runinfo files generated for each job
+RUNINFO_KINDS = ("device", "time", "session", "importtime", "stats")
+# The kinds of runinfo that could be deduplicated (see runinfo_dedup)
+DEDUP_KINDS = ("device", "session")
+# The key in `job.runinfo.time` referring to the deduplicated payload of a kind,
+# relative to the process workdir, e.g. `.runinfo/session.<sha256>`
+DEDUP_PAYLOAD_KEY = "Dedup {kind} payload"
+# The directory (under the process workdir) to store the deduplicated payloads
+STORE_DIRNAME = ".runinfo"
+# The archive (under the process workdir) to pack the runinfo of the jobs
+ARCHIVE_FILENAME = "proc.runinfo.zip"
+# The last line appended to `job.runinfo.time` when the runinfo is finalized
+END_TIME_KEY = "End time (epoch s)"
+# The number of the archives to keep open, see `_read_archive()`
+ARCHIVE_CACHE_SIZE = 8
+
+# str(archive) => ((mtime, size), the opened archive)
+_archives: OrderedDict[str, Tuple[Tuple[float, int], zipfile.ZipFile]] = OrderedDict()
+_archives_lock = threading.Lock()
+
+
+def archive_member(index: int | str, kind: str) -> str:
+    """The name of the runinfo file of a job in the archive
+
+    Args:
+        index: The index of the job
+        kind: The kind of the runinfo
+
+    Returns:
+        The name of the member, e.g. `0/job.runinfo.time`
+    """
+    return f"{index}/job.runinfo.{kind}"
+
+
+def _close_archive(zf: zipfile.ZipFile) -> None:
+    fh = zf.fp
+    zf.close()
+    fh.close()
+
+
+def _read_archive(procdir: PanPath, member: str) -> str | None:
+    """Read a member from the archive of the process
+
+    The opened archive is kept (until it is changed) for the next reads, since
+    parsing the central directory takes seconds for large archives.
+    """
+    archive = procdir / ARCHIVE_FILENAME
+    if not archive.exists():
+        return None
+
+    stat = archive.stat()
+    key = (stat.st_mtime, stat.st_size)
+    path = str(archive)
+    # Also lock the reading, so that an archive is not closed while being read
+    with _archives_lock:
+        cached = _archives.get(path)
+        if cached is not None and cached[0] == key:
+            _archives.move_to_end(path)
+            zf = cached[1]
+        else:
+            if cached is not None:
+                # Changed, e.g. packed again
+                _close_archive(cached[1])
+            zf = zipfile.ZipFile(archive.open("rb"))
+            _archives[path] = (key, zf)
+            if len(_archives) > ARCHIVE_CACHE_SIZE:
+                _close_archive(_archives.popitem(last=False)[1][1])
+
+        try:
+            return zf.read(member).decode()
+        except KeyError:
+            return None
+
+
+def _read_file(metadir: PanPath, kind: str) -> str | None:
+    """Read the runinfo file of a job, from the metadir or the archive"""
+    runinfo_file = metadir / f"job.runinfo.{kind}"
+    if runinfo_file.exists():
+        return runinfo_file.read_text()
+
+    return _read_archive(metadir.parent, archive_member(metadir.name, kind))
+
+
+def read_runinfo(metadir: str | Path, kind: str) -> str | None:
+    """Read the runinfo file of a job.
+
+    Deduplicated payloads (referred to in `job.runinfo.time`) and runinfo
+    packed into the archive of the process are resolved transparently.
+
+    Args:
+        metadir: The metadir of the job, e.g. `<workdir>/<pipeline>/<proc>/0`
+        kind: The kind of the runinfo, one of `device`, `time`, `session`,
+            `importtime` and `stats`
+
+    Returns:
+        The content of the runinfo file, or None if it does not exist.
+    """
+    if kind not in RUNINFO_KINDS:
+        raise ValueError(
+            f"Unknown runinfo kind: {kind!r}, expected one of {RUNINFO_KINDS}"
+        )
+
+    metadir = PanPath(str(metadir))
+    if kind in DEDUP_KINDS:
+        # The time info is generated by every run, so the reference is always
+        # up to date, even if a file is left by a previous run
+        time_info = _read_file(metadir, "time")
+        target = (
+            parse_time(time_info).get(DEDUP_PAYLOAD_KEY.format(kind=kind))
+            if time_info
+            else None
+        )
+        if target:
+            payload = metadir.parent / target
+            if payload.exists():
+                return payload.read_text()
+            return _read_archive(metadir.parent, target)
+
+    return _read_file(metadir, kind)
+
+
+def parse_time(content: str) -> Dict[str, str]:
+    """Parse the content of a `job.runinfo.time` file.
+
+    Args:
+        content: The content of the file
+
+    Returns:
+        The records, e.g. `{"Elapsed real time (s)": "1.23", "Hostname": "node1"}`
+    """
+    out = {}
+    for line in content.splitlines():
+        if line.startswith("#") or ": " not in line:
+            continue
+        key, value = line.split(": ", 1)
+        out[key] = value.strip()
+    return out
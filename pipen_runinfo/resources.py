@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+# The bash code to append the effective resources (the ones the job was allowed
+# to use, rather than the ones of the host) to the device info, and the observations
+# of the job to the time info, with a warning if the job used more than allowed.
+# The device info only gets what is the same for the jobs on the same host, so that
+# it can be deduplicated (see runinfo_dedup).
+# Variables from other parts of the wrapper:
+#   $runinfo_device: The device info file
+#   $runinfo_time: The time info file, to get the observed CPU percentage and
+#       to append the observations to
+#   $runinfo_max_running_threads: The peak number of running threads
+#       (only with live metrics)
+RESOURCES_BASH = r"""
+# plugin: runinfo (effective resources)
+# CPU affinity, like os.sched_getaffinity()
+runinfo_affinity=$(awk '/^Cpus_allowed_list:/ {print $2}' /proc/$$/status)
+runinfo_ncpus=$(echo "$runinfo_affinity" | awk -F, '{
+    n = 0
+    for (i = 1; i <= NF; i++) {
+        if (split($i, r, "-") == 2) n += r[2] - r[1] + 1
+        else if ($i != "") n++
+    }
+    print n
+}')
+
+# The cgroup limits, the tightest one along the cgroup hierarchy
+runinfo_cpu_quota=max
+runinfo_mem_limit=max
+if [[ -f /sys/fs/cgroup/cgroup.controllers ]]; then
+    # cgroup v2
+    runinfo_cgdir=$(awk -F: '$1 == "0" {print $3}' /proc/self/cgroup)
+    runinfo_cgdir="/sys/fs/cgroup${runinfo_cgdir%/}"
+    while [[ "$runinfo_cgdir" == /sys/fs/cgroup* ]]; do
+        if [[ -r "$runinfo_cgdir/cpu.max" ]]; then
+            runinfo_cpu_quota=$(awk -v cur=$runinfo_cpu_quota '{
+                q = ($1 == "max") ? "max" : $1 / $2
+                print (cur == "max" || (q != "max" && q < cur)) ? q : cur
+            }' "$runinfo_cgdir/cpu.max")
+        fi
+        if [[ -r "$runinfo_cgdir/memory.max" ]]; then
+            runinfo_mem_limit=$(awk -v cur=$runinfo_mem_limit '{
+                m = $1
+                print (cur == "max" || (m != "max" && m < cur)) ? m : cur
+            }' "$runinfo_cgdir/memory.max")
+        fi
+        runinfo_cgdir=$(dirname "$runinfo_cgdir")
+    done
+else
+    # cgroup v1
+    runinfo_cgdir=$(awk -F: '$2 ~ /(^|,)cpu(,|$)/ {print $3}' /proc/self/cgroup)
+    runinfo_cgdir="/sys/fs/cgroup/cpu${runinfo_cgdir%/}"
+    while [[ "$runinfo_cgdir" == /sys/fs/cgroup/cpu* ]]; do
+        if [[ -r "$runinfo_cgdir/cpu.cfs_quota_us" ]]; then
+            runinfo_cpu_quota=$(awk \
+                -v cur=$runinfo_cpu_quota \
+                -v p=$(cat "$runinfo_cgdir/cpu.cfs_period_us") '{
+                    q = ($1 < 0) ? "max" : $1 / p
+                    print (cur == "max" || (q != "max" && q < cur)) ? q : cur
+                }' "$runinfo_cgdir/cpu.cfs_quota_us")
+        fi
+        runinfo_cgdir=$(dirname "$runinfo_cgdir")
+    done
+    runinfo_cgdir=$(awk -F: '$2 ~ /(^|,)memory(,|$)/ {print $3}' /proc/self/cgroup)
+    runinfo_cgdir="/sys/fs/cgroup/memory${runinfo_cgdir%/}"
+    while [[ "$runinfo_cgdir" == /sys/fs/cgroup/memory* ]]; do
+        if [[ -r "$runinfo_cgdir/memory.limit_in_bytes" ]]; then
+            # unlimited is reported as a huge number
+            runinfo_mem_limit=$(awk -v cur=$runinfo_mem_limit '{
+                m = ($1 >= 2^60) ? "max" : $1
+                print (cur == "max" || (m != "max" && m < cur)) ? m : cur
+            }' "$runinfo_cgdir/memory.limit_in_bytes")
+        fi
+        runinfo_cgdir=$(dirname "$runinfo_cgdir")
+    done
+fi
+
+runinfo_eff_cpus=$(awk -v n="$runinfo_ncpus" -v q=$runinfo_cpu_quota \
+    'BEGIN {print (q != "max" && (n == "" || q < n + 0)) ? q : n}')
+
+if [[ -f $runinfo_device ]]; then
+    {
+        echo "Effective resources"
+        echo "-------------------"
+        echo "CPU affinity: $runinfo_affinity ($runinfo_ncpus CPUs)"
+        echo "CPU quota (cgroup, CPUs): $runinfo_cpu_quota"
+        echo "Memory limit (cgroup, bytes): $runinfo_mem_limit"
+        echo "Effective CPUs: $runinfo_eff_cpus"
+        echo ""
+    } >> $runinfo_device
+
+    echo "NUMA" >> $runinfo_device
+    echo "----" >> $runinfo_device
+    if numactl --hardware &>/dev/null; then
+        numactl --hardware >> $runinfo_device
+    elif ls /sys/devices/system/node/node* &>/dev/null; then
+        for runinfo_node in /sys/devices/system/node/node*; do
+            echo "$(basename $runinfo_node) cpus: $(cat $runinfo_node/cpulist)" \
+                >> $runinfo_device
+        done
+    else
+        echo "NUMA information is not available." >> $runinfo_device
+    fi
+    echo "" >> $runinfo_device
+fi
+
+# The observations of the job go to the time info, as they differ from job to job
+runinfo_cpu_pct=$(awk -F': ' '/^Percentage of CPU this job got:/ {
+    sub("%", "", $2); if ($2 ~ /^[0-9.]+$/) print $2
+}' $runinfo_time 2>/dev/null)
+runinfo_cpu_freq=$(awk -F': ' '/^cpu MHz/ {
+    f = $2 + 0; s += f; n++
+    if (n == 1 || f < min) min = f
+    if (n == 1 || f > max) max = f
+} END {
+    if (n) printf "min %.0f, mean %.0f, max %.0f (%d CPUs)", min, s / n, max, n
+}' /proc/cpuinfo 2>/dev/null)
+# Warn if the job used more than allowed, which points to oversubscription
+runinfo_warnings=$(awk \
+    -v e="$runinfo_eff_cpus" \
+    -v c="$runinfo_cpu_pct" \
+    -v t="${runinfo_max_running_threads:-}" \
+    'BEGIN {
+        if (e == "" || e + 0 <= 0) exit
+        if (c != "" && c + 0 > e * 105) {
+            printf "CPU percentage (%s%%) exceeds the effective CPUs (%s), ", c, e
+            printf "the job may be oversubscribed. "
+        }
+        if (t != "" && t + 0 > int(e) + (e > int(e))) {
+            printf "Peak running threads (%s) exceeds ", t
+            printf "the effective CPUs (%s), ", e
+            printf "the job may be oversubscribed. "
+        }
+    }')
+{
+    echo "Effective CPUs: ${runinfo_eff_cpus:-not available}"
+    echo "Peak running threads: ${runinfo_max_running_threads:-not available}"
+    echo "CPU frequency (MHz): ${runinfo_cpu_freq:-not available}"
+    if [[ -n "$runinfo_warnings" ]]; then
+        echo "Warnings: ${runinfo_warnings% }"
+    fi
+} >> $runinfo_time
+"""
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import random
+from typing import Any, Mapping
+
+# The environment variable to tell the job script whether the job is sampled
+SAMPLED_ENVVAR = "PIPEN_RUNINFO_SAMPLED"
+# The environment variable to tell the job script the local directory to write
+# the runinfo to, which is moved to the metadir by the job wrapper only if the
+# job is sampled or failed
+TMPDIR_ENVVAR = "PIPEN_RUNINFO_TMPDIR"
+# The keys allowed in the `runinfo_sample` option
+SAMPLE_KEYS = ("first", "every", "fraction", "seed")
+
+
+def check_sample(sample: Mapping[str, Any] | None) -> None:
+    """Check if the `runinfo_sample` option is valid.
+
+    Args:
+        sample: The value of the `runinfo_sample` option
+
+    Raises:
+        ValueError: If the option is invalid
+    """
+    if sample is None:
+        return
+
+    if not isinstance(sample, Mapping):
+        raise ValueError(
+            f"`runinfo_sample` must be a dict with keys {SAMPLE_KEYS}, "
+            f"got {sample!r}"
+        )
+
+    unknown = set(sample) - set(SAMPLE_KEYS)
+    if unknown:
+        raise ValueError(
+            f"Unknown keys for `runinfo_sample`: {sorted(unknown)}, "
+            f"expected any of {SAMPLE_KEYS}"
+        )
+
+    if not set(sample) - {"seed"}:
+        raise ValueError(
+            "`runinfo_sample` must have at least one of `first`, `every` and "
+            f"`fraction`, got {sample!r}"
+        )
+
+    for key in ("first", "every"):
+        value = sample.get(key, None)
+        if value is not None and (
+            not isinstance(value, int) or isinstance(value, bool)
+        ):
+            raise ValueError(
+                f"`runinfo_sample.{key}` must be an integer, got {value!r}"
+            )
+
+    first = sample.get("first", None)
+    if first is not None and first < 0:
+        raise ValueError(
+            f"`runinfo_sample.first` must be non-negative, got {first!r}"
+        )
+
+    fraction = sample.get("fraction", None)
+    if fraction is not None and (
+        not isinstance(fraction, (int, float)) or isinstance(fraction, bool)
+    ):
+        raise ValueError(
+            f"`runinfo_sample.fraction` must be a number, got {fraction!r}"
+        )
+    if fraction is not None and not 0 <= fraction <= 1:
+        raise ValueError(
+            f"`runinfo_sample.fraction` must be between 0 and 1, got {fraction!r}"
+        )
+
+    every = sample.get("every", None)
+    if every is not None and every < 1:
+        raise ValueError(f"`runinfo_sample.every` must be positive, got {every!r}")
+
+
+def is_sampled(sample: Mapping[str, Any] | None, index: int) -> bool:
+    """Check if full runinfo should be collected for the job.
+
+    A job is sampled if any of the criteria matches. Failed jobs are always
+    collected regardless, which is decided when the job finishes.
+
+    Args:
+        sample: The value of the `runinfo_sample` option, None to sample all jobs.
+            - first: Sample the first N jobs
+            - every: Sample every k-th job (the 0th, k-th, 2k-th, ...)
+            - fraction: Sample a random fraction of the jobs
+            - seed: The seed for the random fraction (default: 0). The decision
+                for a job depends only on the seed and its index, so it is
+                reproducible across runs.
+        index: The index of the job
+
+    Returns:
+        True if the job is sampled otherwise False
+    """
+    if sample is None:
+        return True
+
+    first = sample.get("first", None)
+    if first is not None and index < first:
+        return True
+
+    every = sample.get("every", None)
+    if every is not None and index % every == 0:
+        return True
+
+    fraction = sample.get("fraction", None)
+    if fraction is not None:
+        rng = random.Random(f"{sample.get('seed', 0)}:{index}")
+        return rng.random() < fraction
+
+    return False
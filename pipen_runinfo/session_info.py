@@ -4,6 +4,137 @@ import re
 from pipen.utils import ignore_firstline_dedent
 
 from .version import __version__ as version
+from .sampling import SAMPLED_ENVVAR, TMPDIR_ENVVAR
+
+# Import time profiling code for python, inserted at the top of the session info
+# code, so that all imports of the regular script are recorded.
+# Like `python -X importtime`, the time of finding and executing a module is
+# recorded as cumulative time, excluding that of the submodules as self time.
+# ------------------------------------------------------------
+IMPORTTIME_PYTHON = r"""
+class _RuninfoTimedLoader:
+    # Wrap the loader of a single module, so that the loader itself, which could
+    # be shared by many modules (e.g. zipimporter), is not modified
+    def __init__(self, loader, name, timer, load_time):
+        self.loader = loader
+        self.name = name
+        self.timer = timer
+        # time to find and create (e.g. load extension modules) the module
+        self.load_time = load_time
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+    def create_module(self, spec):
+        if not self.timer.active:
+            return self.loader.create_module(spec)
+
+        start = self.timer.perf_counter()
+        try:
+            return self.loader.create_module(spec)
+        finally:
+            self.load_time += self.timer.perf_counter() - start
+
+    def exec_module(self, module):
+        # Expose the original loader to the module and the later reloads
+        module.__loader__ = self.loader
+        if getattr(module, "__spec__", None) is not None:
+            module.__spec__.loader = self.loader
+        if not self.timer.active:
+            return self.loader.exec_module(module)
+
+        stack = self.timer.stack
+        stack.append(0.0)
+        start = self.timer.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            cumulative = self.timer.perf_counter() - start + self.load_time
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            if self.timer.active:
+                self.timer.records.append(
+                    (self.name, cumulative - children, cumulative)
+                )
+
+
+class _RuninfoImportTimer:
+    def __init__(self):
+        # Imported here, as the imports in find_spec would be timed by itself
+        from copy import copy
+        from time import perf_counter
+
+        self.copy = copy
+        self.perf_counter = perf_counter
+        # (name, self time, cumulative time) in seconds
+        self.records = []
+        # cumulative time of the children of the modules being imported
+        self.stack = []
+        self.active = True
+
+    def find_spec(self, name, path=None, target=None):
+        import sys
+
+        if not self.active:
+            return None
+
+        start = self.perf_counter()
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # Built-in and frozen modules are loaded by the importer classes
+        if (
+            isinstance(loader, type)
+            or not hasattr(loader, "create_module")
+            or not hasattr(loader, "exec_module")
+        ):
+            return spec
+
+        # Not to modify the spec, which could be cached by the finder
+        spec = self.copy(spec)
+        spec.loader = _RuninfoTimedLoader(
+            loader,
+            name,
+            self,
+            self.perf_counter() - start,
+        )
+        return spec
+
+    def stop(self):
+        import sys
+
+        # Not to record the imports at exit (e.g. by the session info code)
+        self.active = False
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def write(self, top):
+        records = sorted(self.records, key=lambda rec: rec[1], reverse=True)[:top]
+
+        runinfo_file = _runinfo_file("importtime")
+        with runinfo_file.open("w") as fout:
+            fout.write("# Generated by pipen_runinfo v%(version)s\n")
+            fout.write("# Lang: python\n")
+            fout.write(f"# Top {len(records)} modules by self import time\n")
+            fout.write("Module\tSelf (us)\tCumulative (us)\n")
+            for name, self_time, cumulative in records:
+                fout.write(
+                    f"{name}\t{self_time * 1e6:.0f}\t{cumulative * 1e6:.0f}\n"
+                )
+
+
+_runinfo_import_timer = _RuninfoImportTimer()
+__import__("sys").meta_path.insert(0, _runinfo_import_timer)
+
+"""
 
 # Session info code for python
 # ------------------------------------------------------------
@@ -12,6 +143,26 @@ SESSION_INFO_PYTHON = r"""
 import atexit as _atexit
 
 
+def _runinfo_file(kind: str):
+    import os
+
+    # The local directory exported by the job wrapper, which moves the files to
+    # the metadir only if the job is sampled or failed
+    tmpdir = os.environ.get("%(tmpdir_envvar)s")
+    if tmpdir and os.path.isdir(tmpdir):
+        from pathlib import Path
+
+        return Path(tmpdir) / f"job.runinfo.{kind}"
+
+    {%% if "://" in str(job.metadir) %%}
+    from yunpath import AnyPath as _AnyPath
+    {%% else %%}
+    from pathlib import Path as _AnyPath
+    {%% endif %%}
+    return _AnyPath("{{job.metadir}}/job.runinfo.%%s" %% kind)
+
+%(importtime_hook)s
+
 def _session_info(show_path: bool, include_submodule: bool):
     try:
         from importlib import metadata as importlib_metadata
@@ -20,13 +171,8 @@ def _session_info(show_path: bool, include_submodule: bool):
 
     import sys
     import warnings
-    {%% if "://" in str(job.metadir) %%}
-    from yunpath import AnyPath as _AnyPath
-    {%% else %%}
-    from pathlib import Path as _AnyPath
-    {%% endif %%}
 
-    runinfo_file = _AnyPath("{{job.metadir}}/job.runinfo.session")
+    runinfo_file = _runinfo_file("session")
 
     lines = ["# Generated by pipen_runinfo v%(version)s\n", "# Lang: python\n"]
     if show_path:
@@ -68,7 +214,11 @@ def _session_info(show_path: bool, include_submodule: bool):
 
 @_atexit.register
 def _run_session_info():
+    %(importtime_stop)s
+    # Written for unsampled jobs as well, since the return code is not known
+    # here (e.g. sys.exit()), the job wrapper decides whether to keep it
     _session_info(%(show_path)s, %(include_submodule)s)
+    %(importtime_write)s
 
 
 # End of injected by pipen_runinfo
@@ -87,6 +237,7 @@ def inject_session_code_python(
     script: str,
     show_path: bool,
     include_submodule: bool,
+    importtime: bool | int = False,
 ) -> str:
     """Inject the session info code into a python script.
 
@@ -94,14 +245,29 @@ def inject_session_code_python(
         script: The script to inject the session info code into.
         show_path: Whether to include the path of the modules in the session info.
         include_submodule: Whether to include submodules in the session info.
+        importtime: Whether to record the import time of the modules.
+            True to record the top 50 modules by self time, or an integer for
+            the top N modules.
 
     Returns:
         The injected script.
     """
+    if not importtime:
+        importtime_hook = importtime_stop = importtime_write = ""
+    else:
+        top = 50 if importtime is True else int(importtime)
+        importtime_hook = IMPORTTIME_PYTHON % {"version": version}
+        importtime_stop = "_runinfo_import_timer.stop()"
+        importtime_write = f"_runinfo_import_timer.write({top})"
+
     code = SESSION_INFO_PYTHON % {
         "version": version,
         "show_path": show_path,
         "include_submodule": include_submodule,
+        "tmpdir_envvar": TMPDIR_ENVVAR,
+        "importtime_hook": importtime_hook,
+        "importtime_stop": importtime_stop,
+        "importtime_write": importtime_write,
     }
     script = ignore_firstline_dedent(script)
     parts = future_import_statement.split(script, 1)
@@ -121,37 +287,150 @@ def inject_session_code_python(
     return f"{code}\n\n{script}"
 
 
+# Namespace load time profiling code for R, inserted before the session info code.
+# loadNamespace() is traced (library() and requireNamespace() call it as well),
+# the time of loading a namespace is recorded as cumulative time, excluding that of
+# the namespaces it imports as self time.
+# ------------------------------------------------------------
+IMPORTTIME_R = r"""
+if (!exists(".runinfo.load", envir = globalenv())) {
+    .runinfo.env <- new.env()
+    .runinfo.env$top <- %(top)s
+    .runinfo.env$stack <- numeric(0)
+    .runinfo.env$records <- data.frame(
+        Namespace = character(0),
+        Self = numeric(0),
+        Cumulative = numeric(0)
+    )
+    assign(".runinfo.load", .runinfo.env, envir = globalenv())
+    suppressMessages(trace(
+        "loadNamespace",
+        print = FALSE,
+        tracer = quote({
+            .runinfo.env <- get(".runinfo.load", envir = globalenv())
+            .runinfo.start <- proc.time()[["elapsed"]]
+            .runinfo.new <- !(as.character(package) %%in%% loadedNamespaces())
+            if (.runinfo.new) {
+                .runinfo.env$stack <- c(.runinfo.env$stack, 0)
+            }
+        }),
+        exit = quote({
+            if (.runinfo.new) {
+                .runinfo.cumulative <- proc.time()[["elapsed"]] - .runinfo.start
+                .runinfo.n <- length(.runinfo.env$stack)
+                .runinfo.children <- .runinfo.env$stack[.runinfo.n]
+                .runinfo.env$stack <- .runinfo.env$stack[-.runinfo.n]
+                if (.runinfo.n > 1) {
+                    .runinfo.env$stack[.runinfo.n - 1] <-
+                        .runinfo.env$stack[.runinfo.n - 1] + .runinfo.cumulative
+                }
+                # The exit code also runs when loading fails,
+                # e.g. requireNamespace("missing", quietly = TRUE)
+                if (isNamespaceLoaded(as.character(package))) {
+                    .runinfo.env$records <- rbind(
+                        .runinfo.env$records,
+                        data.frame(
+                            Namespace = as.character(package),
+                            Self = .runinfo.cumulative - .runinfo.children,
+                            Cumulative = .runinfo.cumulative
+                        )
+                    )
+                }
+            }
+        })
+    ))
+    rm(.runinfo.env)
+}
+"""
+
 # Session info code for R
 # ------------------------------------------------------------
 SESSION_INFO_R = r"""
+%(importtime_hook)s
 # If script is being executed directly, set options and re-source to get line numbers
 .Last <- function() {
-    .runinfo.session.file <- "{{job.metadir}}/job.runinfo.session"
-    tryCatch({
-        if (grepl("://", .runinfo.session.file)) {
-            .runinfo.session.file.orig <- .runinfo.session.file
-            .runinfo.session.file <- tempfile()
+    # Written for unsampled jobs as well, since the exit status is not known
+    # here (e.g. quit(status = 1)), the job wrapper decides whether to keep it
+    .runinfo.metadir <- Sys.getenv("%(tmpdir_envvar)s")
+    if (!nzchar(.runinfo.metadir) || !dir.exists(.runinfo.metadir)) {
+        .runinfo.metadir <- "{{job.metadir}}"
+    }
+    .runinfo.write <- function(lines, kind) {
+        runinfo_file <- paste0(.runinfo.metadir, "/job.runinfo.", kind)
+        if (grepl("://", runinfo_file)) {
+            tmpfile <- tempfile()
+            writeLines(lines, tmpfile)
+            system2("cloudsh", c("mv", tmpfile, runinfo_file))
+        } else {
+            writeLines(lines, runinfo_file)
         }
-        writeLines(
+    }
+    .runinfo.header <- c("# Generated by pipen_runinfo v%(version)s", "# Lang: R")
+    tryCatch({
+        .runinfo.write(
+            c(.runinfo.header, capture.output(sessionInfo())),
+            "session"
+        )
+
+        # Memory and time statistics
+        .runinfo.gc <- gc()
+        .runinfo.gc.max <- which(colnames(.runinfo.gc) == "max used")
+        .runinfo.time <- proc.time()
+        .runinfo.stats <- c(
+            gc.Ncells.max_used = .runinfo.gc["Ncells", .runinfo.gc.max],
+            gc.Ncells.max_used_mb = .runinfo.gc["Ncells", .runinfo.gc.max + 1],
+            gc.Vcells.max_used = .runinfo.gc["Vcells", .runinfo.gc.max],
+            gc.Vcells.max_used_mb = .runinfo.gc["Vcells", .runinfo.gc.max + 1],
+            proc_time.user_self = .runinfo.time[["user.self"]],
+            proc_time.sys_self = .runinfo.time[["sys.self"]],
+            proc_time.elapsed = .runinfo.time[["elapsed"]],
+            proc_time.user_child = .runinfo.time[["user.child"]],
+            proc_time.sys_child = .runinfo.time[["sys.child"]],
+            namespaces.loaded = length(loadedNamespaces()),
+            namespaces.attached = sum(startsWith(search(), "package:"))
+        )
+        .runinfo.write(
             c(
-                "# Generated by pipen_runinfo v%(version)s",
-                "# Lang: R",
-                capture.output(sessionInfo())
+                .runinfo.header,
+                "Statistic\tValue",
+                paste(names(.runinfo.stats), .runinfo.stats, sep = "\t")
             ),
-            .runinfo.session.file
+            "stats"
         )
 
-        if (exists(".runinfo.session.file.orig")) {
-            system2(
-                "cloudsh",
-                c("mv", .runinfo.session.file, .runinfo.session.file.orig)
+        # Namespace load time
+        if (exists(".runinfo.load", envir = globalenv())) {
+            .runinfo.load <- get(".runinfo.load", envir = globalenv())
+            .runinfo.records <- .runinfo.load$records
+            .runinfo.records <- .runinfo.records[
+                order(.runinfo.records$Self, decreasing = TRUE), ,
+                drop = FALSE
+            ]
+            .runinfo.records <- head(.runinfo.records, .runinfo.load$top)
+            .runinfo.write(
+                c(
+                    .runinfo.header,
+                    paste0(
+                        "# Top ",
+                        nrow(.runinfo.records),
+                        " namespaces by self load time"
+                    ),
+                    "Namespace\tSelf (us)\tCumulative (us)",
+                    paste(
+                        .runinfo.records$Namespace,
+                        round(.runinfo.records$Self * 1e6),
+                        round(.runinfo.records$Cumulative * 1e6),
+                        sep = "\t"
+                    )
+                ),
+                "importtime"
             )
         }
     }, error = function(e) {
         # Ignore errors in .Last to avoid masking original errors
         cat(
             "Warning: Failed to write session info to ",
-            .runinfo.session.file,
+            .runinfo.metadir,
             ": ",
             conditionMessage(e),
             "\n",
@@ -180,17 +459,42 @@ if (!interactive() && sys.nframe() == 0L) {
     # Don't proceed further, we already sourced
     quit(status = 0)
 }
-""" % {"version": version}
+"""
 
 
 def inject_session_code_r(
     script: str,
     show_path: bool,
     include_submodule: bool,
+    importtime: bool | int = False,
 ) -> str:
+    """Inject the session info code into an R script.
+
+    Args:
+        script: The script to inject the session info code into.
+        show_path: Not used for R.
+        include_submodule: Not used for R.
+        importtime: Whether to record the load time of the namespaces.
+            True to record the top 50 namespaces by self time, or an integer for
+            the top N namespaces.
+
+    Returns:
+        The injected script.
+    """
+    if not importtime:
+        importtime_hook = ""
+    else:
+        top = 50 if importtime is True else int(importtime)
+        importtime_hook = IMPORTTIME_R % {"top": top}
+
+    code = SESSION_INFO_R % {
+        "version": version,
+        "tmpdir_envvar": TMPDIR_ENVVAR,
+        "importtime_hook": importtime_hook,
+    }
     # indent = " " * 4
     injected = [f"# Injected by pipen_runinfo v{version}, please do not modify"]
-    injected.extend(SESSION_INFO_R.splitlines())
+    injected.extend(code.splitlines())
     injected.append("")
     injected.append("# End of injected by pipen_runinfo, please do not modify")
     injected.append("# ------------------------------------------------------")
@@ -207,7 +511,18 @@ def inject_session_code_r(
 SESSION_INFO_BASH = r"""
 # Injected by pipen_runinfo v%(version)s, please do not modify
 _session_info() {
-    runinfo_file="{{job.metadir}}/job.runinfo.session"
+    local rc=$?
+    # Skip unsampled jobs, unless they failed
+    if [[ "${%(sampled_envvar)s:-1}" == "0" && $rc -eq 0 ]]; then
+        return
+    fi
+
+    if [[ -d "${%(tmpdir_envvar)s:-}" ]]; then
+        # Moved to the metadir by the job wrapper
+        runinfo_file="$%(tmpdir_envvar)s/job.runinfo.session"
+    else
+        runinfo_file="{{job.metadir}}/job.runinfo.session"
+    fi
     if [[ "$runinfo_file" == *"://"* ]]; then
         runinfo_file_orig="$runinfo_file"
         runinfo_file=$(mktemp)
@@ -235,13 +550,18 @@ trap _session_info EXIT
 # ------------------------------------------------------------
 # Regular script starts
 # ------------------------------------------------------------
-""" % {"version": version}
+""" % {
+    "version": version,
+    "sampled_envvar": SAMPLED_ENVVAR,
+    "tmpdir_envvar": TMPDIR_ENVVAR,
+}
 
 
 def inject_session_code_bash(
     script: str,
     show_path: bool,
     include_submodule: bool,
+    importtime: bool | int = False,
 ) -> str:
     return f"{SESSION_INFO_BASH}\n\n{script}"
 
@@ -252,6 +572,10 @@ SESSION_INFO_FISH = r"""
 # Injected by pipen_runinfo v%(version)s, please do not modify
 function _session_info
     set -l runinfo_file "{{job.metadir}}/job.runinfo.session"
+    # Written for unsampled jobs as well, the job wrapper decides whether to keep it
+    if set -q %(tmpdir_envvar)s; and test -d "$%(tmpdir_envvar)s"
+        set runinfo_file "$%(tmpdir_envvar)s/job.runinfo.session"
+    end
     if string match -q "*://*" $runinfo_file
         set runinfo_file_orig $runinfo_file
         set runinfo_file (mktemp)
@@ -275,13 +599,14 @@ trap _session_info EXIT
 # ------------------------------------------------------------
 # Regular script starts
 # ------------------------------------------------------------
-""" % {"version": version}
+""" % {"version": version, "tmpdir_envvar": TMPDIR_ENVVAR}
 
 
 def inject_session_code_fish(
     script: str,
     show_path: bool,
     include_submodule: bool,
+    importtime: bool | int = False,
 ) -> str:
     return f"{SESSION_INFO_FISH}\n\n{script}"
 
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from statistics import median
+from typing import List, Mapping, NamedTuple, Sequence, Tuple
+
+from .reader import END_TIME_KEY, parse_time
+from .version import __version__
+
+# The report file under the process workdir
+STRAGGLERS_FILENAME = "proc.runinfo.stragglers"
+# The minimum number of jobs with the records to detect the stragglers
+MIN_JOBS = 3
+# The default threshold of the robust z-score to flag the outliers
+# (Iglewicz and Hoaglin)
+DEFAULT_THRESHOLD = 3.5
+
+
+class HostStats(NamedTuple):
+    host: str
+    jobs: int
+    median_elapsed: float
+    # The median throughput of the host relative to the process
+    relative_throughput: float
+    # The robust z-score of the median elapsed time of the host
+    zscore: float
+
+
+class Straggler(NamedTuple):
+    index: int
+    host: str
+    elapsed: float
+    zscore: float
+
+
+def time_record(content: str) -> Tuple[str, float] | None:
+    """Get the hostname and the elapsed time from a `job.runinfo.time` file.
+
+    Args:
+        content: The content of the file
+
+    Returns:
+        The hostname and the elapsed time (seconds), or None if not available
+    """
+    info = parse_time(content)
+    host = info.get("Hostname")
+    if not host:
+        return None
+
+    try:
+        # GNU time is more accurate, as it times the command only
+        return host, float(info["Elapsed real time (s)"])
+    except (KeyError, ValueError):
+        pass
+
+    try:
+        return host, float(info[END_TIME_KEY]) - float(info["Start time (epoch s)"])
+    except (KeyError, ValueError):
+        return None
+
+
+def robust_scale(values: Sequence[float]) -> Tuple[float, float]:
+    """Get the median and the scale for the robust z-scores.
+
+    The scale is the MAD divided by 0.6745, falling back to the mean absolute
+    deviation times 1.2533 if the MAD is 0 (more than half of the values are
+    identical).
+
+    Args:
+        values: The values
+
+    Returns:
+        The median and the scale, the scale is 0 if all values are identical
+    """
+    med = median(values)
+    deviations = [abs(value - med) for value in values]
+    mad = median(deviations)
+    if mad > 0:
+        return med, mad / 0.6745
+
+    return med, 1.2533 * sum(deviations) / len(deviations)
+
+
+def detect_stragglers(
+    records: Mapping[int, Tuple[str, float]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Tuple[List[HostStats], List[Straggler]]:
+    """Detect the straggler jobs and rank the hosts by their throughput.
+
+    Args:
+        records: The hostname and the elapsed time of the jobs,
+            with the job indexes as keys
+        threshold: The robust z-score above which a job or a host is slow
+
+    Returns:
+        The stats of the hosts, slowest first, and the straggler jobs,
+        slowest first
+    """
+    if not records:
+        return [], []
+
+    med, scale = robust_scale([elapsed for _, elapsed in records.values()])
+
+    def zscore(value: float) -> float:
+        return (value - med) / scale if scale > 0 else 0.0
+
+    stragglers = [
+        Straggler(index, host, elapsed, zscore(elapsed))
+        for index, (host, elapsed) in records.items()
+    ]
+    stragglers = sorted(
+        (straggler for straggler in stragglers if straggler.zscore > threshold),
+        key=lambda straggler: -straggler.elapsed,
+    )
+
+    elapsed_by_host = {}
+    for host, elapsed in records.values():
+        elapsed_by_host.setdefault(host, []).append(elapsed)
+
+    hosts = []
+    for host, elapsed in elapsed_by_host.items():
+        host_med = median(elapsed)
+        hosts.append(
+            HostStats(
+                host,
+                len(elapsed),
+                host_med,
+                # throughput is the reciprocal of the elapsed time
+                med / host_med if host_med > 0 else float("inf"),
+                zscore(host_med),
+            )
+        )
+    hosts.sort(key=lambda stats: (stats.relative_throughput, stats.host))
+
+    return hosts, stragglers
+
+
+def format_report(
+    hosts: Sequence[HostStats],
+    stragglers: Sequence[Straggler],
+    threshold: float,
+) -> str:
+    """Format the report of the hosts and the straggler jobs
+
+    Args:
+        hosts: The stats of the hosts
+        stragglers: The straggler jobs
+        threshold: The threshold of the robust z-score
+
+    Returns:
+        The report
+    """
+    lines = [
+        f"# Generated by pipen-runinfo v{__version__}",
+        f"# Robust z-score threshold: {threshold}",
+        "",
+        "Hosts",
+        "-----",
+        "Host\tJobs\tMedian elapsed (s)\tRelative throughput\tRobust z-score\tSlow",
+    ]
+    for stats in hosts:
+        lines.append(
+            f"{stats.host}\t{stats.jobs}\t{stats.median_elapsed:.3f}\t"
+            f"{stats.relative_throughput:.3f}\t{stats.zscore:.2f}\t"
+            f"{'yes' if stats.zscore > threshold else 'no'}"
+        )
+
+    lines.extend(
+        [
+            "",
+            "Stragglers",
+            "----------",
+            "Job\tHost\tElapsed (s)\tRobust z-score",
+        ]
+    )
+    for straggler in stragglers:
+        lines.append(
+            f"{straggler.index}\t{straggler.host}\t{straggler.elapsed:.3f}\t"
+            f"{straggler.zscore:.2f}"
+        )
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, TextIO, Tuple
+
+from .reader import END_TIME_KEY
+
+# The default trace file under the pipeline workdir
+TRACE_FILENAME = "pipeline.runinfo.trace.json"
+
+# key in job.runinfo.time => (name of the argument, unit suffix to strip)
+TRACE_ARGS = {
+    "Maximum resident set size (kB)": ("max_rss_kb", ""),
+    "Percentage of CPU this job got": ("cpu_percent", "%"),
+    "Exit status": ("exit_status", ""),
+    "Return code": ("return_code", ""),
+}
+
+
+def _number(value: str) -> float | int | str:
+    for type_ in (int, float):
+        try:
+            return type_(value)
+        except ValueError:
+            pass
+    return value
+
+
+def job_slice(index: int, info: Mapping[str, str]) -> Dict[str, Any] | None:
+    """Build the trace event (a complete event, without the pid and tid) of a job
+
+    Args:
+        index: The index of the job
+        info: The parsed `job.runinfo.time`
+
+    Returns:
+        The event, or None if the host or the start/end time is not available
+    """
+    try:
+        host = info["Hostname"]
+        start = float(info["Start time (epoch s)"])
+        end = float(info[END_TIME_KEY])
+    except (KeyError, ValueError):
+        return None
+
+    args: Dict[str, Any] = {"index": index, "host": host}
+    submit = info.get("Submit time (epoch s)")
+    if submit:
+        args["submit_time"] = float(submit)
+        args["queue_wait_s"] = round(start - float(submit), 6)
+    args["start_time"] = start
+    args["end_time"] = end
+    for key, (name, suffix) in TRACE_ARGS.items():
+        value = info.get(key)
+        if value:
+            args[name] = _number(value[: -len(suffix)] if suffix else value)
+
+    return {
+        "name": f"job {index}",
+        "cat": "job",
+        "ph": "X",
+        # microseconds
+        "ts": round(start * 1e6),
+        "dur": max(round((end - start) * 1e6), 0),
+        "args": args,
+    }
+
+
+class TraceWriter:
+    """Stream the jobs of a pipeline to a trace-event JSON file, which can be
+    loaded by chrome://tracing or https://ui.perfetto.dev
+
+    The processes of the pipeline are the processes of the trace, and each job
+    is a slice on a lane of the host it ran on. Concurrent jobs on the same host
+    go to different lanes (`<host> #1`, `<host> #2`, ...).
+
+    The events are written in the JSON array format as they come, so the memory
+    does not grow with the number of the jobs, and an unfinished file (without
+    the closing bracket) is still loadable.
+
+    Args:
+        path: The path of the trace file
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._fh: TextIO | None = None
+        self._n_events = 0
+        self._n_procs = 0
+        # The processes could be added from different threads
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self.path.open("w")
+        self._fh.write("[")
+
+    def _write(self, event: Mapping[str, Any]) -> None:
+        self._fh.write(",\n" if self._n_events else "\n")
+        self._fh.write(json.dumps(event, separators=(",", ":")))
+        self._n_events += 1
+
+    def _metadata(self, kind: str, pid: int, tid: int, **args: Any) -> None:
+        self._write({"name": kind, "ph": "M", "pid": pid, "tid": tid, "args": args})
+
+    def add_proc(
+        self,
+        name: str,
+        records: Iterable[Tuple[int, Mapping[str, str]]],
+    ) -> int:
+        """Write the jobs of a process
+
+        Args:
+            name: The name of the process
+            records: The index and the parsed `job.runinfo.time` of the jobs
+
+        Returns:
+            The number of the jobs written
+        """
+        with self._lock:
+            return self._add_proc(name, records)
+
+    def _add_proc(
+        self,
+        name: str,
+        records: Iterable[Tuple[int, Mapping[str, str]]],
+    ) -> int:
+        self._n_procs += 1
+        pid = self._n_procs
+        self._metadata("process_name", pid, 0, name=name)
+        self._metadata("process_sort_index", pid, 0, sort_index=pid)
+
+        # host => [[tid, end time of the last job], ...]
+        lanes: Dict[str, List[List[Any]]] = {}
+        n_lanes = 0
+        n_jobs = 0
+        for index, info in records:
+            event = job_slice(index, info)
+            if event is None:
+                continue
+
+            host_lanes = lanes.setdefault(event["args"]["host"], [])
+            for lane in host_lanes:
+                if lane[1] <= event["ts"]:
+                    break
+            else:
+                n_lanes += 1
+                lane = [n_lanes, 0]
+                host_lanes.append(lane)
+                self._metadata(
+                    "thread_name",
+                    pid,
+                    n_lanes,
+                    name=f"{event['args']['host']} #{len(host_lanes)}",
+                )
+                self._metadata("thread_sort_index", pid, n_lanes, sort_index=n_lanes)
+
+            lane[1] = event["ts"] + event["dur"]
+            event["pid"] = pid
+            event["tid"] = lane[0]
+            self._write(event)
+            n_jobs += 1
+
+        self._fh.flush()
+        return n_jobs
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is None:
+                return
+            self._fh.write("\n]\n")
+            self._fh.close()
+            self._fh = None
@@ -0,0 +1,31 @@
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def wait_for_wrappers():
+    """The jobs are marked as finished before the runinfo is finalized by the
+    wrappers, so wait for the wrappers (local scheduler) to exit"""
+
+    def _wait(procdir, timeout=30):
+        for jobdir in procdir.glob("[0-9]*"):
+            # job.jid is renamed to job.jid.used after the status is updated
+            try:
+                pid = int((jobdir / "job.jid").read_text())
+            except (FileNotFoundError, ValueError):
+                pid = int((jobdir / "job.jid.used").read_text())
+            start = time.time()
+            while time.time() - start < timeout:
+                try:
+                    os.kill(pid, 0)
+                    # Exited but not reaped, as the event loop is closed
+                    with open(f"/proc/{pid}/stat") as fstat:
+                        if fstat.read().rsplit(")", 1)[1].split()[0] == "Z":
+                            break
+                except (ProcessLookupError, FileNotFoundError):
+                    break
+                time.sleep(0.1)
+
+    return _wait
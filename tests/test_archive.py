@@ -0,0 +1,108 @@
+import zipfile
+
+import pytest  # noqa
+from pipen_runinfo.__main__ import main
+from pipen_runinfo import reader
+from pipen_runinfo.archive import pack_runinfo
+from pipen_runinfo.reader import (
+    ARCHIVE_FILENAME,
+    STORE_DIRNAME,
+    read_runinfo,
+)
+
+
+@pytest.fixture
+def procdir(tmp_path):
+    store = tmp_path / STORE_DIRNAME
+    store.mkdir()
+    (store / "session.abc").write_text("# Lang: python\n")
+
+    for i in range(3):
+        metadir = tmp_path / str(i)
+        metadir.mkdir()
+        (metadir / "job.runinfo.time").write_text(
+            f"Exit status: {i}\n"
+            f"Dedup session payload: {STORE_DIRNAME}/session.abc\n"
+        )
+        (metadir / "job.rc").write_text("0")
+
+    (tmp_path / "0" / "job.runinfo.device").write_text("Hostname: node0\n")
+    return tmp_path
+
+
+def test_pack_runinfo(procdir):
+    assert pack_runinfo(procdir, range(3)) == 5
+    assert not (procdir / STORE_DIRNAME).exists()
+    assert not list(procdir.glob("*/job.runinfo.*"))
+    # other files untouched
+    assert (procdir / "0" / "job.rc").is_file()
+
+    with zipfile.ZipFile(procdir / ARCHIVE_FILENAME) as zf:
+        assert sorted(zf.namelist()) == [
+            f"{STORE_DIRNAME}/session.abc",
+            "0/job.runinfo.device",
+            "0/job.runinfo.time",
+            "1/job.runinfo.time",
+            "2/job.runinfo.time",
+        ]
+
+    assert read_runinfo(procdir / "0", "device") == "Hostname: node0\n"
+    assert read_runinfo(procdir / "1", "time").startswith("Exit status: 1\n")
+    assert read_runinfo(procdir / "2", "session") == "# Lang: python\n"
+    assert read_runinfo(procdir / "1", "device") is None
+    assert read_runinfo(procdir / "3", "time") is None
+
+    # nothing to pack
+    assert pack_runinfo(procdir, range(3)) == 0
+
+
+def test_pack_runinfo_rerun(procdir):
+    pack_runinfo(procdir, range(3))
+
+    # job 0 rerun without the device info, job 1 and 2 cached
+    (procdir / "0" / "job.runinfo.time").write_text("Exit status: 10\n")
+    assert pack_runinfo(procdir, range(3)) == 1
+
+    assert read_runinfo(procdir / "0", "time") == "Exit status: 10\n"
+    assert read_runinfo(procdir / "0", "device") is None
+    assert read_runinfo(procdir / "0", "session") is None
+    assert read_runinfo(procdir / "1", "time").startswith("Exit status: 1\n")
+    assert read_runinfo(procdir / "1", "session") == "# Lang: python\n"
+
+
+def test_read_runinfo_archive_reused(procdir, monkeypatch):
+    pack_runinfo(procdir, range(3))
+
+    opened = []
+    zipfile_cls = zipfile.ZipFile
+
+    def _zipfile(file, *args, **kwargs):
+        # the ones opened by pack_runinfo() are not counted
+        if hasattr(file, "read"):
+            opened.append(file)
+        return zipfile_cls(file, *args, **kwargs)
+
+    monkeypatch.setattr(reader.zipfile, "ZipFile", _zipfile)
+    for i in range(3):
+        assert read_runinfo(procdir / str(i), "time").startswith(f"Exit status: {i}")
+        assert read_runinfo(procdir / str(i), "session") == "# Lang: python\n"
+    assert len(opened) == 1
+
+    # opened again when changed
+    (procdir / "1" / "job.runinfo.time").write_text("Exit status: 100\n")
+    pack_runinfo(procdir, range(3))
+    (procdir / "1" / "job.runinfo.time").write_text("Exit status: 11\n")
+    assert read_runinfo(procdir / "1", "time") == "Exit status: 11\n"
+    (procdir / "1" / "job.runinfo.time").unlink()
+    assert read_runinfo(procdir / "1", "time") == "Exit status: 100\n"
+    assert len(opened) == 2
+
+
+def test_main_archive(procdir, capsys):
+    pack_runinfo(procdir, range(3))
+
+    assert main([str(procdir / "0"), "device", "session"]) == 0
+    assert capsys.readouterr().out == "Hostname: node0\n# Lang: python\n"
+
+    assert main([str(procdir / "1"), "device"]) == 1
+    assert "job.runinfo.device not found" in capsys.readouterr().err
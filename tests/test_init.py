@@ -1,6 +1,22 @@
+import hashlib
+import json
+import re
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+
 import pytest  # noqa
 from pipen import Proc, Pipen
-from pipen_runinfo import _get_lang
+from pipen_runinfo import _dedup_code, _get_lang
+from pipen_runinfo.reader import (
+    ARCHIVE_FILENAME,
+    STORE_DIRNAME,
+    parse_time,
+    read_runinfo,
+)
+from pipen_runinfo.sampling import TMPDIR_ENVVAR
+from pipen_runinfo.stragglers import STRAGGLERS_FILENAME
+from pipen_runinfo.trace import TRACE_FILENAME
 
 
 # @pytest.mark.forked
@@ -81,3 +97,379 @@ def test_get_lang():
     assert _get_lang("sh") == "sh"
     assert _get_lang("zsh") == "zsh"
     assert _get_lang("python3.8.1") == "python"
+
+
+def test_pipeline_dedup(tmp_path, wait_for_wrappers, caplog):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    class PythonDedup(Proc):
+        """Running info for Python, deduplicated."""
+
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = "print({{in.var}})"
+        lang = "python"
+        plugin_opts = {"runinfo_dedup": True}
+
+    pipeline = (
+        Pipen(
+            name="PipelineDedup",
+            forks=2,
+            outdir=outdir,
+            workdir=workdir,
+        )
+        .set_starts(PythonDedup)
+        .set_data([0, 1, 2])
+    )
+    pipeline.run()
+
+    procdir = workdir / "PipelineDedup" / "PythonDedup"
+    wait_for_wrappers(procdir)
+    sessions = list((procdir / STORE_DIRNAME).glob("session.*"))
+    assert len(sessions) == 1
+    # The host usage is not in the device info, so it is identical as well
+    devices = list((procdir / STORE_DIRNAME).glob("device.*"))
+    assert len(devices) == 1
+    for i in range(3):
+        # Referred to in the time info, without files in the metadir
+        assert not (procdir / str(i) / "job.runinfo.session").exists()
+        assert not (procdir / str(i) / "job.runinfo.device").exists()
+        time_info = parse_time(read_runinfo(procdir / str(i), "time"))
+        assert time_info["Dedup session payload"] == (
+            f"{STORE_DIRNAME}/{sessions[0].name}"
+        )
+        assert "Memory available (kB)" in time_info
+        assert read_runinfo(procdir / str(i), "session") == sessions[0].read_text()
+        assert "Lang: python" in read_runinfo(procdir / str(i), "session")
+        assert "Hostname" in read_runinfo(procdir / str(i), "device")
+
+    # The session info is identical for all jobs
+    assert re.search(r"runinfo: [12] job\(s\) deduplicated", caplog.text)
+
+
+def _run_dedup_code(metadir, device=None, session=None):
+    tmpdir = metadir / "tmp"
+    tmpdir.mkdir(parents=True)
+    if device is not None:
+        (metadir / "job.runinfo.device").write_text(device)
+    if session is not None:
+        (tmpdir / "job.runinfo.session").write_text(session)
+
+    job = SimpleNamespace(metadir=SimpleNamespace(mounted=metadir))
+    code = (
+        f'runinfo_time="{metadir}/job.runinfo.time"\n'
+        f'runinfo_device="{metadir}/job.runinfo.device"\n'
+        f'runinfo_tmpdir="{tmpdir}"\n'
+    ) + _dedup_code(job)
+    subprocess.run(["bash", "-c", code], check=True)
+    return (metadir / "job.runinfo.time").read_text()
+
+
+def test_dedup_code(tmp_path):
+    procdir = tmp_path / "Proc"
+    metadir = procdir / "0"
+    metadir.mkdir(parents=True)
+    # left by a previous run
+    (metadir / "job.runinfo.session").write_text("# Lang: bash\n")
+
+    time_info = _run_dedup_code(metadir, "Hostname\n", "# Lang: python\n")
+    device_digest = hashlib.sha256(b"Hostname\n").hexdigest()
+    session_digest = hashlib.sha256(b"# Lang: python\n").hexdigest()
+    assert time_info == (
+        f"Dedup device payload: {STORE_DIRNAME}/device.{device_digest}\n"
+        f"Dedup session payload: {STORE_DIRNAME}/session.{session_digest}\n"
+        "Dedup payloads stored: 2\n"
+        "Dedup payloads reused: 0\n"
+        "Dedup bytes saved: 0\n"
+    )
+    assert sorted(path.name for path in metadir.iterdir()) == [
+        "job.runinfo.time",
+        "tmp",
+    ]
+    assert not any((metadir / "tmp").iterdir())
+    assert sorted(path.name for path in (procdir / STORE_DIRNAME).iterdir()) == [
+        f"device.{device_digest}",
+        f"session.{session_digest}",
+    ]
+    assert read_runinfo(metadir, "device") == "Hostname\n"
+    assert read_runinfo(metadir, "session") == "# Lang: python\n"
+
+    # reused by another job
+    time_info = _run_dedup_code(procdir / "1", "Hostname\n", "# Lang: python\n")
+    assert time_info.endswith(
+        "Dedup payloads stored: 0\n"
+        "Dedup payloads reused: 2\n"
+        "Dedup bytes saved: 24\n"
+    )
+    assert read_runinfo(procdir / "1", "session") == "# Lang: python\n"
+
+
+def test_pipeline_sample(tmp_path, wait_for_wrappers):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    def run(sample):
+        class PythonSample(Proc):
+            """Running info for Python, sampled."""
+
+            input = "var"
+            input_data = [0, 1, 2, 3, 4]
+            output = "var:var:{{in.var}}"
+            script = """
+                import os
+                import sys
+                with open("%s/tmpdir.{{in.var}}", "w") as fout:
+                    fout.write(os.environ["%s"])
+                if {{in.var}} == 3:
+                    raise ValueError("Error")
+                if {{in.var}} == 4:
+                    sys.exit(3)
+            """ % (tmp_path, TMPDIR_ENVVAR)
+            lang = "python"
+            cache = False
+            error_strategy = "ignore"
+            plugin_opts = {"runinfo_sample": sample}
+
+        Pipen(
+            name="PipelineSample",
+            forks=2,
+            outdir=outdir,
+            workdir=workdir,
+        ).set_starts(PythonSample).run()
+        wait_for_wrappers(procdir)
+
+    procdir = workdir / "PipelineSample" / "PythonSample"
+    # full runinfo for all jobs first
+    run(None)
+    assert (procdir / "1" / "job.runinfo.session").is_file()
+
+    run({"first": 1})
+    for i in range(5):
+        time_info = parse_time(read_runinfo(procdir / str(i), "time"))
+        assert "Effective CPUs" in time_info
+        assert "CPU frequency (MHz)" in time_info
+
+    # sampled and failed jobs
+    for i in (0, 3, 4):
+        device = (procdir / str(i) / "job.runinfo.device").read_text()
+        assert "Effective resources" in device
+        assert "Effective CPUs: " in device
+        # the observations of the job are not in the device info
+        assert "Peak running threads" not in device
+        assert "CPU frequency" not in device
+        assert (procdir / str(i) / "job.runinfo.session").is_file()
+
+    # the ones from the previous run are removed, too
+    for i in (1, 2):
+        assert not (procdir / str(i) / "job.runinfo.device").exists()
+        assert not (procdir / str(i) / "job.runinfo.session").exists()
+
+    # the local directories the scripts wrote the runinfo to are removed
+    for i in range(5):
+        assert not Path((tmp_path / f"tmpdir.{i}").read_text()).exists()
+
+
+def test_pipeline_importtime(tmp_path):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    class PythonImporttime(Proc):
+        """Running info for Python, with import time."""
+
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = """
+            import json
+            import pipen
+        """
+        lang = "python"
+        plugin_opts = {"runinfo_importtime": 5}
+
+    pipeline = (
+        Pipen(
+            name="PipelineImporttime",
+            forks=2,
+            outdir=outdir,
+            workdir=workdir,
+        )
+        .set_starts(PythonImporttime)
+        .set_data([0])
+    )
+    pipeline.run()
+
+    jobdir = workdir / "PipelineImporttime" / "PythonImporttime" / "0"
+    importtime = read_runinfo(jobdir, "importtime").splitlines()
+    assert importtime[3] == "Module\tSelf (us)\tCumulative (us)"
+    assert len(importtime) == 9
+    modules = [line.split("\t")[0] for line in importtime[4:]]
+    assert len(modules) == 5
+
+
+def test_pipeline_importtime_at_exit(tmp_path):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    class PythonImporttimeAtExit(Proc):
+        """Running info for Python, with import time of all modules."""
+
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = """
+            import json
+            import email.mime.text
+        """
+        lang = "python"
+        plugin_opts = {"runinfo_importtime": 1000}
+
+    pipeline = (
+        Pipen(
+            name="PipelineImporttimeAtExit",
+            outdir=outdir,
+            workdir=workdir,
+        )
+        .set_starts(PythonImporttimeAtExit)
+        .set_data([0])
+    )
+    pipeline.run()
+
+    jobdir = workdir / "PipelineImporttimeAtExit" / "PythonImporttimeAtExit" / "0"
+    importtime = read_runinfo(jobdir, "importtime").splitlines()
+    modules = {line.split("\t")[0] for line in importtime[4:]}
+    assert "json" in modules
+    assert "email.mime.text" in modules
+    # the imports by the session info code at exit are not recorded
+    assert "importlib.metadata" not in modules
+
+
+def test_pipeline_stragglers(tmp_path, caplog):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    class PythonStragglers(Proc):
+        """Running info for Python, with a straggler."""
+
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = """
+            import time
+            time.sleep(3 if {{in.var}} == 5 else 0.{{in.var}})
+        """
+        lang = "python"
+        plugin_opts = {"runinfo_stragglers": True}
+
+    pipeline = (
+        Pipen(
+            name="PipelineStragglers",
+            forks=3,
+            outdir=outdir,
+            workdir=workdir,
+        )
+        .set_starts(PythonStragglers)
+        .set_data(list(range(6)))
+    )
+    pipeline.run()
+
+    procdir = workdir / "PipelineStragglers" / "PythonStragglers"
+    time_info = read_runinfo(procdir / "0", "time")
+    assert "Hostname: " in time_info
+    assert "End time (epoch s): " in time_info
+
+    report = (procdir / STRAGGLERS_FILENAME).read_text()
+    assert report.splitlines()[3:5] == ["Hosts", "-----"]
+    assert report.split("Stragglers\n----------\n")[1].splitlines()[1].startswith(
+        "5\t"
+    )
+    assert "1 straggler job(s) [5]" in caplog.text
+
+
+def test_pipeline_pack(tmp_path):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    class PythonPack(Proc):
+        """Running info for Python, packed."""
+
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = "print({{in.var}})"
+        lang = "python"
+        plugin_opts = {"runinfo_dedup": True, "runinfo_pack": True}
+
+    pipeline = (
+        Pipen(
+            name="PipelinePack",
+            forks=2,
+            outdir=outdir,
+            workdir=workdir,
+        )
+        .set_starts(PythonPack)
+        .set_data([0, 1, 2])
+    )
+    pipeline.run()
+
+    procdir = workdir / "PipelinePack" / "PythonPack"
+    assert (procdir / ARCHIVE_FILENAME).is_file()
+    assert not (procdir / STORE_DIRNAME).exists()
+    for i in range(3):
+        assert not list((procdir / str(i)).glob("job.runinfo.*"))
+        assert "Lang: python" in read_runinfo(procdir / str(i), "session")
+        assert "Hostname" in read_runinfo(procdir / str(i), "device")
+        assert "End time (epoch s): " in read_runinfo(procdir / str(i), "time")
+
+
+def test_pipeline_trace(tmp_path):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+
+    class PythonTrace1(Proc):
+        """Running info for Python, traced."""
+
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = "print({{in.var}})"
+        lang = "python"
+
+    class PythonTrace2(Proc):
+        """Running info for Python, traced."""
+
+        requires = PythonTrace1
+        input = "var"
+        output = "var:var:{{in.var}}"
+        script = "print({{in.var}})"
+        lang = "python"
+        plugin_opts = {"runinfo_pack": True}
+
+    pipeline = (
+        Pipen(
+            name="PipelineTrace",
+            forks=2,
+            outdir=outdir,
+            workdir=workdir,
+            plugin_opts={"runinfo_trace": True},
+        )
+        .set_starts(PythonTrace1)
+        .set_data([0, 1, 2])
+    )
+    pipeline.run()
+
+    events = json.loads((workdir / "PipelineTrace" / TRACE_FILENAME).read_text())
+    procs = [
+        event["args"]["name"] for event in events if event["name"] == "process_name"
+    ]
+    assert procs == ["PythonTrace1", "PythonTrace2"]
+
+    slices = [event for event in events if event["ph"] == "X"]
+    assert len(slices) == 6
+    for event in slices:
+        assert event["dur"] >= 0
+        assert event["args"]["return_code"] == 0
+        assert event["args"]["queue_wait_s"] >= 0
+        assert event["args"]["submit_time"] <= event["args"]["start_time"]
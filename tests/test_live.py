@@ -0,0 +1,199 @@
+import asyncio
+import socket
+import urllib.request
+
+import pytest  # noqa
+from pipen import Proc, Pipen
+from pipen_runinfo.live import LiveMetrics, format_openmetrics, parse_live
+from pipen_runinfo.reader import parse_time, read_runinfo
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_parse_live():
+    content = (
+        "# Generated by pipen-runinfo\n"
+        "timestamp: 1700000000\n"
+        "rss_bytes: 1024\n"
+        "cpu_percent: 99.5\n"
+        "bad: value\n"
+        "malformed\n"
+    )
+    assert parse_live(content) == {
+        "timestamp": 1700000000,
+        "rss_bytes": 1024,
+        "cpu_percent": 99.5,
+    }
+
+
+def test_format_openmetrics():
+    text = format_openmetrics(
+        'pipe"line',
+        {("P", 0): {"rss_bytes": 109535232, "cpu_percent": 99.5}},
+    )
+    assert text.endswith("# EOF\n")
+    assert 'pipen_running_jobs{pipeline="pipe\\"line"} 1' in text
+    assert (
+        'pipen_job_rss_bytes{pipeline="pipe\\"line",proc="P",job="0"} 109535232'
+        in text
+    )
+    assert 'pipen_job_cpu_percent{pipeline="pipe\\"line",proc="P",job="0"} 99.5' in (
+        text
+    )
+    assert "pipen_job_processes{" not in text
+
+
+def test_live_metrics_serve(tmp_path):
+    port = _free_port()
+    textfile = tmp_path / "live.prom"
+
+    async def main():
+        live = LiveMetrics("pipeline", interval=0.1, port=port, textfile=textfile)
+        await live.start()
+        await asyncio.sleep(0.2)
+        text = await asyncio.to_thread(
+            lambda: urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics")
+            .read()
+            .decode()
+        )
+        await live.stop()
+        return text
+
+    text = asyncio.run(main())
+    assert 'pipen_running_jobs{pipeline="pipeline"} 0' in text
+    assert textfile.read_text() == text
+
+
+def test_pipeline_live(tmp_path, wait_for_wrappers):
+
+    outdir = tmp_path / "outdir"
+    workdir = tmp_path / "workdir"
+    textfile = tmp_path / "live.prom"
+    port = _free_port()
+
+    class PythonLive(Proc):
+        """Running info for Python, with live metrics."""
+
+        input = "var"
+        output = "outfile:file:{{in.var}}.txt"
+        script = """
+            import time
+            import urllib.request
+
+            time.sleep(3.5)
+            with urllib.request.urlopen("http://127.0.0.1:%s/metrics") as resp:
+                text = resp.read().decode()
+            with open("{{out.outfile}}", "w") as fout:
+                fout.write(text)
+        """ % port
+        lang = "python"
+
+    pipeline = (
+        Pipen(
+            name="PipelineLive",
+            forks=2,
+            outdir=outdir,
+            workdir=workdir,
+            plugin_opts={
+                "runinfo_live": 1,
+                "runinfo_live_port": port,
+                "runinfo_live_textfile": str(textfile),
+            },
+        )
+        .set_starts(PythonLive)
+        .set_data([0])
+    )
+    pipeline.run()
+
+    text = (outdir / "PythonLive" / "0.txt").read_text()
+    assert 'pipen_job_rss_bytes{pipeline="PipelineLive",proc="PythonLive",job="0"}' in (
+        text
+    )
+    assert 'pipen_running_jobs{pipeline="PipelineLive"} 0' in textfile.read_text()
+    # removed when the job is done
+    jobdir = workdir / "PipelineLive" / "PythonLive" / "0"
+    wait_for_wrappers(jobdir.parent)
+    assert not (jobdir / "job.runinfo.live").exists()
+    # the peak number of running threads is recorded in the time info
+    time_info = parse_time(read_runinfo(jobdir, "time"))
+    assert time_info["Peak running threads"].isdigit()
+
+
+def test_pipeline_live_port_in_use(tmp_path, caplog):
+
+    textfile = tmp_path / "live.prom"
+
+    class PythonLivePortInUse(Proc):
+        """Running info for Python, with the port of live metrics in use."""
+
+        input = "var"
+        output = "outfile:file:{{in.var}}.txt"
+        script = "open('{{out.outfile}}', 'w').close()"
+        lang = "python"
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        pipeline = (
+            Pipen(
+                name="PipelineLivePortInUse",
+                outdir=tmp_path / "outdir",
+                workdir=tmp_path / "workdir",
+                plugin_opts={
+                    "runinfo_live_port": sock.getsockname()[1],
+                    "runinfo_live_textfile": str(textfile),
+                },
+            )
+            .set_starts(PythonLivePortInUse)
+            .set_data([0])
+        )
+        assert pipeline.run()
+
+    assert "`runinfo_live` is 0" in caplog.text
+    assert "failed to serve the live metrics on port" in caplog.text
+    # still written to the textfile
+    assert 'pipen_running_jobs{pipeline="PipelineLivePortInUse"} 0' in (
+        textfile.read_text()
+    )
+
+
+def test_live_metrics_textfile_dir_missing(tmp_path, caplog):
+    textfile = tmp_path / "nonexisting" / "live.prom"
+
+    async def main():
+        live = LiveMetrics("pipeline", interval=0.1, textfile=textfile)
+        await live.start()
+        await asyncio.sleep(0.2)
+        await live.stop()
+
+    asyncio.run(main())
+    assert "the directory of the live metrics textfile does not exist" in (
+        caplog.text
+    )
+    assert not textfile.parent.exists()
+
+
+def test_live_metrics_refresh_failed(tmp_path, caplog):
+    textdir = tmp_path / "textdir"
+    textdir.mkdir()
+    textfile = textdir / "live.prom"
+
+    async def main():
+        live = LiveMetrics("pipeline", interval=0.1, textfile=textfile)
+        await live.start()
+        await asyncio.sleep(0.15)
+        textfile.unlink()
+        textdir.rmdir()
+        await asyncio.sleep(0.25)
+        # still refreshing
+        assert not live._task.done()
+        # not raising
+        await live.stop()
+
+    asyncio.run(main())
+    assert "failed to refresh the live metrics" in caplog.text
+    assert "failed to write the live metrics to" in caplog.text
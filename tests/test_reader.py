@@ -0,0 +1,52 @@
+import pytest
+from pipen_runinfo.__main__ import main
+from pipen_runinfo.reader import STORE_DIRNAME, read_runinfo
+
+
+@pytest.fixture
+def metadir(tmp_path):
+    store = tmp_path / STORE_DIRNAME
+    store.mkdir()
+    (store / "session.abc").write_text("# Lang: python\n")
+
+    metadir = tmp_path / "0"
+    metadir.mkdir()
+    # left by a previous run, shadowed by the deduplicated payload
+    (metadir / "job.runinfo.session").write_text("# Lang: bash\n")
+    (metadir / "job.runinfo.time").write_text(
+        "Exit status: 0\n"
+        f"Dedup session payload: {STORE_DIRNAME}/session.abc\n"
+    )
+    return metadir
+
+
+def test_read_runinfo(metadir):
+    assert read_runinfo(metadir, "session") == "# Lang: python\n"
+    assert read_runinfo(metadir, "time").startswith("Exit status: 0\n")
+    assert read_runinfo(metadir, "device") is None
+
+
+def test_read_runinfo_unknown_kind(metadir):
+    with pytest.raises(ValueError):
+        read_runinfo(metadir, "unknown")
+
+
+def test_main(metadir, capsys):
+    assert main([str(metadir), "session"]) == 0
+    assert capsys.readouterr().out == "# Lang: python\n"
+
+    # only the available ones
+    assert main([str(metadir)]) == 0
+    assert capsys.readouterr().out == (
+        "Exit status: 0\n"
+        f"Dedup session payload: {STORE_DIRNAME}/session.abc\n"
+        "# Lang: python\n"
+    )
+
+    assert main([str(metadir), "device"]) == 1
+    assert "job.runinfo.device not found" in capsys.readouterr().err
+
+
+def test_main_invalid_kind(metadir):
+    with pytest.raises(SystemExit):
+        main([str(metadir), "unknown"])
@@ -0,0 +1,61 @@
+import pytest
+from pipen_runinfo.sampling import check_sample, is_sampled
+
+
+@pytest.mark.parametrize(
+    "sample",
+    [
+        None,
+        {"first": 10},
+        {"fraction": 1},
+        {"every": 3, "fraction": 0.5, "seed": 1},
+    ],
+)
+def test_check_sample(sample):
+    check_sample(sample)
+
+
+@pytest.mark.parametrize(
+    "sample",
+    [
+        10,
+        {},
+        {"seed": 1},
+        {"last": 10},
+        {"first": "10"},
+        {"first": -1},
+        {"every": 2.5},
+        {"every": True},
+        {"fraction": "0.5"},
+        {"fraction": 1.5},
+        {"every": 0},
+    ],
+)
+def test_check_sample_invalid(sample):
+    with pytest.raises(ValueError):
+        check_sample(sample)
+
+
+def test_is_sampled():
+    assert all(is_sampled(None, i) for i in range(10))
+    assert not any(is_sampled({}, i) for i in range(10))
+
+    sampled = [i for i in range(10) if is_sampled({"first": 3}, i)]
+    assert sampled == [0, 1, 2]
+
+    sampled = [i for i in range(10) if is_sampled({"every": 4}, i)]
+    assert sampled == [0, 4, 8]
+
+    sampled = [i for i in range(10) if is_sampled({"first": 2, "every": 4}, i)]
+    assert sampled == [0, 1, 4, 8]
+
+
+def test_is_sampled_fraction():
+    sample = {"fraction": 0.2, "seed": 8525}
+    sampled = [i for i in range(1000) if is_sampled(sample, i)]
+    assert 150 < len(sampled) < 250
+    # reproducible
+    assert sampled == [i for i in range(1000) if is_sampled(sample, i)]
+    # depends on the seed
+    sampled2 = [i for i in range(1000) if is_sampled({**sample, "seed": 1}, i)]
+    assert sampled != sampled2
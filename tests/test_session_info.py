@@ -1,5 +1,10 @@
+import sys
+import zipfile
+import zipimport
+
 import pytest
 from pipen_runinfo.session_info import (
+    IMPORTTIME_PYTHON,
     inject_session_code_python,
     inject_session_code_r,
     inject_session_code_bash,
@@ -86,3 +91,67 @@ def test_get_inject_session_code_fun():
     assert get_inject_session_code_fun("bash") == inject_session_code_bash
     assert get_inject_session_code_fun("fish") == inject_session_code_fish
     assert get_inject_session_code_fun("unknown") is None
+
+
+def test_inject_session_code_python_importtime():
+    script = "print('Hello, World!')"
+    injected_script = inject_session_code_python(script, True, False)
+    assert "_RuninfoImportTimer" not in injected_script
+
+    injected_script = inject_session_code_python(script, True, False, True)
+    assert "_RuninfoImportTimer" in injected_script
+    assert "_runinfo_import_timer.write(50)" in injected_script
+
+    injected_script = inject_session_code_python(script, True, False, 10)
+    assert "_runinfo_import_timer.write(10)" in injected_script
+
+
+def test_import_timer_shared_loader(tmp_path, monkeypatch):
+    # The modules in a zip file share the same loader (zipimporter)
+    zippath = tmp_path / "runinfo_modules.zip"
+    with zipfile.ZipFile(zippath, "w") as zf:
+        zf.writestr("runinfo_zipmod_a.py", "import runinfo_zipmod_b\n")
+        zf.writestr("runinfo_zipmod_b.py", "")
+        zf.writestr("runinfo_zipmod_c.py", "")
+        zf.writestr("runinfo_zipmod_d.py", "")
+    monkeypatch.syspath_prepend(str(zippath))
+    for name in ("a", "b", "c", "d"):
+        monkeypatch.delitem(sys.modules, f"runinfo_zipmod_{name}", raising=False)
+
+    namespace = {}
+    exec(IMPORTTIME_PYTHON % {"version": "0.0.0"}, namespace)
+    timer = namespace["_runinfo_import_timer"]
+    try:
+        import runinfo_zipmod_a
+        import runinfo_zipmod_c
+    finally:
+        timer.stop()
+    import runinfo_zipmod_d  # noqa: F401
+
+    names = [rec[0] for rec in timer.records]
+    assert sorted(names) == [
+        "runinfo_zipmod_a",
+        "runinfo_zipmod_b",
+        "runinfo_zipmod_c",
+    ]
+    # the shared loader is neither wrapped nor modified
+    loader = runinfo_zipmod_a.__loader__
+    assert isinstance(loader, zipimport.zipimporter)
+    assert runinfo_zipmod_a.__spec__.loader is loader
+    assert runinfo_zipmod_c.__loader__ is loader
+    assert "exec_module" not in vars(loader)
+    assert "create_module" not in vars(loader)
+    assert timer not in sys.meta_path
+
+
+def test_inject_session_code_r_importtime():
+    script = "print('Hello, World!')"
+    injected_script = inject_session_code_r(script, False, False)
+    assert 'trace(\n        "loadNamespace"' not in injected_script
+    assert '"stats"' in injected_script
+
+    injected_script = inject_session_code_r(script, False, False, 10)
+    assert 'trace(\n        "loadNamespace"' in injected_script
+    assert ".runinfo.env$top <- 10" in injected_script
+    assert "isNamespaceLoaded(as.character(package))" in injected_script
+    assert "%in%" in injected_script
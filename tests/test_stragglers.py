@@ -0,0 +1,80 @@
+import pytest  # noqa
+from pipen_runinfo.stragglers import (
+    detect_stragglers,
+    format_report,
+    robust_scale,
+    time_record,
+)
+
+
+def test_time_record():
+    assert time_record("Exit status: 0\n") is None
+    assert time_record(
+        "# Generated by pipen-runinfo\n\n"
+        "Elapsed real time (s): 1.50\n"
+        "Hostname: node1\n"
+        "Start time (epoch s): 100.0\n"
+        "End time (epoch s): 102.0\n"
+    ) == ("node1", 1.5)
+    # GNU time not available
+    assert time_record(
+        "GNU time is not available, job is not timed.\n"
+        "See: https://www.gnu.org/software/time/\n"
+        "Hostname: node1\n"
+        "Start time (epoch s): 100.0\n"
+        "End time (epoch s): 102.5\n"
+    ) == ("node1", 2.5)
+
+
+def test_robust_scale():
+    assert robust_scale([1, 2, 3, 4, 100]) == (3, pytest.approx(1 / 0.6745))
+    # MAD is 0
+    med, scale = robust_scale([1, 1, 1, 1, 6])
+    assert med == 1
+    assert scale == pytest.approx(1.2533)
+    assert robust_scale([1, 1, 1]) == (1, 0)
+
+
+def test_detect_stragglers():
+    records = {i: (f"node{i % 3}", 10.0 + i % 4 * 0.1) for i in range(12)}
+    hosts, stragglers = detect_stragglers(records)
+    assert stragglers == []
+    assert all(stats.zscore < 3.5 for stats in hosts)
+
+    # a slow node
+    records.update({i: ("node3", 30.0 + i % 2) for i in range(12, 15)})
+    # a straggler on a normal node
+    records[15] = ("node0", 50.0)
+    hosts, stragglers = detect_stragglers(records)
+    assert [straggler.index for straggler in stragglers] == [15, 13, 12, 14]
+    assert hosts[0].host == "node3"
+    assert hosts[0].jobs == 3
+    assert hosts[0].median_elapsed == 30.0
+    assert hosts[0].relative_throughput == pytest.approx(10.2 / 30.0)
+    assert hosts[0].zscore > 3.5
+    assert all(stats.zscore < 3.5 for stats in hosts[1:])
+
+    assert detect_stragglers({}) == ([], [])
+
+
+def test_format_report():
+    records = {i: ("node0", 10.0 + i % 2) for i in range(5)}
+    records[5] = ("node1", 100.0)
+    report = format_report(*detect_stragglers(records), threshold=3.5)
+    lines = report.splitlines()
+    assert lines[1] == "# Robust z-score threshold: 3.5"
+    assert lines[3:6] == [
+        "Hosts",
+        "-----",
+        "Host\tJobs\tMedian elapsed (s)\tRelative throughput\tRobust z-score\tSlow",
+    ]
+    assert lines[6].startswith("node1\t1\t100.000\t0.105\t")
+    assert lines[6].endswith("\tyes")
+    assert lines[7].startswith("node0\t5\t10.000\t1.050\t")
+    assert lines[7].endswith("\tno")
+    assert lines[9:12] == [
+        "Stragglers",
+        "----------",
+        "Job\tHost\tElapsed (s)\tRobust z-score",
+    ]
+    assert lines[12].startswith("5\tnode1\t100.000\t")
@@ -0,0 +1,97 @@
+import json
+
+import pytest  # noqa
+from pipen_runinfo.trace import TraceWriter, job_slice
+
+
+def _info(host, start, end, **kwargs):
+    info = {
+        "Hostname": host,
+        "Submit time (epoch s)": str(start - 1),
+        "Start time (epoch s)": str(start),
+        "End time (epoch s)": str(end),
+    }
+    info.update(kwargs)
+    return info
+
+
+def test_job_slice():
+    assert job_slice(0, {"Hostname": "node1"}) is None
+
+    event = job_slice(
+        1,
+        _info(
+            "node1",
+            100.5,
+            102.0,
+            **{
+                "Maximum resident set size (kB)": "2048",
+                "Percentage of CPU this job got": "95%",
+                "Exit status": "0",
+                "Return code": "0",
+            },
+        ),
+    )
+    assert event == {
+        "name": "job 1",
+        "cat": "job",
+        "ph": "X",
+        "ts": 100500000,
+        "dur": 1500000,
+        "args": {
+            "index": 1,
+            "host": "node1",
+            "submit_time": 99.5,
+            "queue_wait_s": 1.0,
+            "start_time": 100.5,
+            "end_time": 102.0,
+            "max_rss_kb": 2048,
+            "cpu_percent": 95,
+            "exit_status": 0,
+            "return_code": 0,
+        },
+    }
+
+
+def test_trace_writer(tmp_path):
+    trace = TraceWriter(tmp_path / "trace" / "trace.json")
+    trace.open()
+    assert trace.add_proc(
+        "Proc1",
+        [
+            (0, _info("node1", 0, 10)),
+            (1, _info("node1", 1, 5)),
+            (2, _info("node2", 1, 5)),
+            # reuse the lane of job 1
+            (3, _info("node1", 6, 8)),
+            (4, {}),
+        ],
+    ) == 4
+    # unfinished files are still loadable
+    assert json.loads((tmp_path / "trace" / "trace.json").read_text() + "]")
+
+    assert trace.add_proc("Proc2", [(0, _info("node1", 10, 11))]) == 1
+    trace.close()
+    trace.close()
+
+    events = json.loads((tmp_path / "trace" / "trace.json").read_text())
+    names = {
+        (event["pid"], event["args"]["name"])
+        for event in events
+        if event["name"] in ("process_name", "thread_name")
+    }
+    assert names == {
+        (1, "Proc1"),
+        (1, "node1 #1"),
+        (1, "node1 #2"),
+        (1, "node2 #1"),
+        (2, "Proc2"),
+        (2, "node1 #1"),
+    }
+
+    lanes = {
+        (event["pid"], event["args"]["index"]): event["tid"]
+        for event in events
+        if event["ph"] == "X"
+    }
+    assert lanes == {(1, 0): 1, (1, 1): 2, (1, 2): 3, (1, 3): 2, (2, 0): 1}